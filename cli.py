@@ -1,15 +1,77 @@
 from inspect import signature
 from types import MethodType
 from pathlib import Path
+from time import perf_counter, process_time
+from contextlib import redirect_stdout, redirect_stderr
 import importlib
+import argparse
+import hashlib
+import json
+import ast
 import traceback
 import modules
 import pkgutil
 import cmd
 import sys
 import gc
+import os
 
 PROJECT_ROOT = Path(__file__).parent
+MANIFEST_PATH = PROJECT_ROOT / ".command_manifest.json"
+SOCKET_PATH = PROJECT_ROOT / ".losts_funnys.sock"
+
+class Timings:
+    """Collects scan, import and command timings when profiling is enabled (LOSTS_PROFILE=1 or 'profile on')"""
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.scans = {}     # module -> (seconds, from cache)
+        self.imports = {}   # module -> seconds
+        self.commands = {}  # command -> [calls, wall, cpu, max wall]
+
+    def record_scan(self, module_name: str, seconds: float, cached: bool):
+        if self.enabled:
+            self.scans[module_name] = (seconds, cached)
+
+    def record_import(self, module_name: str, seconds: float):
+        if self.enabled:
+            self.imports[module_name] = seconds
+
+    def record_command(self, command: str, wall: float, cpu: float):
+        if not self.enabled:
+            return
+
+        stats = self.commands.setdefault(command, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += wall
+        stats[2] += cpu
+        stats[3] = max(stats[3], wall)
+
+    def reset(self):
+        self.scans.clear()
+        self.imports.clear()
+        self.commands.clear()
+
+    def summary(self) -> str:
+        """Returns the collected timings as a printable table"""
+        lines = [f"{'Module':<20}{'Scan ms':>10}{'Import ms':>12}"]
+        for module_name in sorted(self.scans.keys() | self.imports.keys()):
+            scan, cached = self.scans.get(module_name, (None, False))
+            scan_text = "-" if scan is None else f"{scan * 1000:.2f}{'*' if cached else ''}"
+            imported = self.imports.get(module_name)
+            import_text = "-" if imported is None else f"{imported * 1000:.2f}"
+            lines.append(f"{module_name:<20}{scan_text:>10}{import_text:>12}")
+
+        lines.append("(* = taken from the manifest)")
+        lines.append("")
+        lines.append(f"{'Command':<20}{'Calls':>7}{'Wall ms':>12}{'CPU ms':>12}{'Avg ms':>10}{'Max ms':>10}")
+        for command, (calls, wall, cpu, longest) in sorted(self.commands.items(), key=lambda x: -x[1][1]):
+            lines.append(
+                f"{command:<20}{calls:>7}{wall * 1000:>12.2f}{cpu * 1000:>12.2f}{wall / calls * 1000:>10.2f}{longest * 1000:>10.2f}"
+            )
+
+        return "\n".join(lines)
+
+TIMINGS = Timings(enabled=os.environ.get("LOSTS_PROFILE", "") not in ("", "0"))
 
 class losts_funnys(cmd.Cmd):
     intro = 'Losts funnys CLI. Type ? or help <topic> for help\n'
@@ -17,6 +79,18 @@ class losts_funnys(cmd.Cmd):
 
     _module_map = {}
 
+    def onecmd(self, line):
+        if not TIMINGS.enabled:
+            return super().onecmd(line)
+
+        command = self.parseline(line)[0]
+        wall, cpu = perf_counter(), process_time()
+        try:
+            return super().onecmd(line)
+        finally:
+            if command and hasattr(self, f"do_{command}"):
+                TIMINGS.record_command(command, perf_counter() - wall, process_time() - cpu)
+
     def do_exit(self, _args):
         """Exit the CLI."""
         _ = _args
@@ -26,15 +100,65 @@ class losts_funnys(cmd.Cmd):
     def do_clear(self, _args):
         """Clear the screen."""
         _ = _args
-        import os
         os.system('cls' if os.name == 'nt' else 'clear')
 
     def do_reload(self, _args):
-        """Reloads all modules"""
+        """Reloads the modules whose source changed since they were loaded"""
         _ = _args
         # operate on the class so commands are added/removed at the class level
-        unload_modules(self.__class__, modules)
-        load_modules(self.__class__, modules)
+        reload_modules(self.__class__, modules)
+
+    def do_profile(self, args):
+        """
+        Shows where the time goes while loading modules and running commands.
+        Usage:
+            profile                     Print the collected timings
+            profile on | off            Start or stop collecting (or start with LOSTS_PROFILE=1)
+            profile reset               Forget the collected timings
+            profile run <command>       Run one command under cProfile and print the hot spots
+            profile save <file> <command>   Same as run, but dump the stats to a file for pstats/snakeviz
+        """
+        sub, _, rest = args.strip().partition(" ")
+        rest = rest.strip()
+
+        match sub:
+            case "" | "show":
+                if not TIMINGS.enabled and not (TIMINGS.scans or TIMINGS.imports or TIMINGS.commands):
+                    print("Profiling is off. Use 'profile on' or start with LOSTS_PROFILE=1")
+                    return
+                print(TIMINGS.summary())
+            case "on":
+                TIMINGS.enabled = True
+                print("Profiling on")
+            case "off":
+                TIMINGS.enabled = False
+                print("Profiling off")
+            case "reset":
+                TIMINGS.reset()
+                print("Timings cleared")
+            case "run" | "save":
+                import cProfile
+                import pstats
+
+                filename = None
+                if sub == "save":
+                    filename, _, rest = rest.partition(" ")
+                    rest = rest.strip()
+
+                if not rest:
+                    print("Missing command to profile")
+                    return
+
+                profiler = cProfile.Profile()
+                profiler.runcall(self.onecmd, rest)
+
+                if filename:
+                    profiler.dump_stats(filename)
+                    print(f"Saved profile to {filename}")
+                else:
+                    pstats.Stats(profiler, stream=self.stdout).sort_stats("cumulative").print_stats(20)
+            case _:
+                print(f"Unknown profile option: {sub}")
 
     def load_file(self, module_name, filename, mode = "r", encoding = None):
         full_path = PROJECT_ROOT / f"{module_name}/{filename}"
@@ -50,59 +174,276 @@ class losts_funnys(cmd.Cmd):
         with full_path.open(mode, encoding=encoding) as file:
             file.write(data)
 
+def module_source(finder, module_name: str, ispkg: bool) -> Path:
+    """Returns the source file of a module found by pkgutil"""
+    if ispkg:
+        return Path(finder.path) / module_name / "__init__.py"
+    return Path(finder.path) / f"{module_name}.py"
+
+def scan_commands(source: Path) -> dict[str, str | None]:
+    """Finds the do_ and help_ functions of a module (and their docstrings) without importing it"""
+    return scan_module(source)[0]
+
+def scan_module(source: Path, package: str = modules.__name__) -> tuple[dict[str, str | None], list[str]]:
+    """
+    Finds the commands of a module (see scan_commands) and the other modules of the package it imports
+    (from .x import y, from . import x, import package.x ...), so a reload can also redo its dependents
+    """
+    tree = ast.parse(source.read_bytes(), filename=str(source))
+    commands = {}
+
+    for item in tree.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if item.name.startswith("do_") or item.name.startswith("help_"):
+                commands[item.name] = ast.get_docstring(item, clean=False)
+
+    imports = set()
+    # walk the whole tree, imports inside functions count too
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            if node.level == 1 or node.module == package:
+                if node.module and node.level:
+                    imports.add(node.module.split(".")[0])
+                else:
+                    imports.update(alias.name for alias in node.names)
+            elif not node.level and node.module and node.module.startswith(f"{package}."):
+                imports.add(node.module.split(".")[1])
+        elif isinstance(node, ast.Import):
+            imports.update(alias.name.split(".")[1] for alias in node.names if alias.name.startswith(f"{package}."))
+
+    return commands, sorted(imports)
+
+def attach_commands(cli, module) -> list:
+    """Attaches the do_ and help_ functions of an imported module to the CLI class"""
+    functions = []
+
+    for attr in dir(module):
+        if attr.startswith("do_") or attr.startswith("help_"):
+            func = getattr(module, attr)
+            if not callable(func):
+                continue
+
+            parameters = signature(func).parameters
+
+            if len(parameters) > 0 and next(iter(parameters)) == "self":
+                func = MethodType(func, cli)
+
+            setattr(cli, attr, func)
+            functions.append(func)
+
+    return functions
+
+def import_module_commands(cli, modules, module_name: str) -> bool:
+    """Imports a module on first use and replaces its lazy commands with the real ones"""
+    fullname = f'{modules.__name__}.{module_name}'
+
+    try:
+        if fullname in sys.modules:
+            module = sys.modules[fullname]
+        else:
+            start = perf_counter()
+            module = importlib.import_module(fullname)
+            TIMINGS.record_import(module_name, perf_counter() - start)
+
+        attach_commands(cli, module)
+
+    except Exception as e:
+        print(f"Failed to load {fullname}: {e}")
+        traceback.print_exc()
+        return False
+
+    # commands that were scanned but not created by the import stay lazy forever otherwise
+    for attr in cli._module_map.get(module_name, []):
+        if getattr(getattr(cli, attr, None), "_lazy_module", None) == module_name:
+            delattr(cli, attr)
+
+    return True
+
+def make_lazy_command(cli, modules, module_name: str, attr: str, doc: str | None):
+    """Creates a placeholder command that imports its module the first time it is run"""
+    def lazy_command(self, *args):
+        if not import_module_commands(cli, modules, module_name):
+            return
+
+        command = getattr(self, attr, None)
+        if command is None:
+            print(f"{module_name} no longer provides {attr}")
+            return
+
+        return command(*args)
+
+    lazy_command.__name__ = attr
+    lazy_command.__doc__ = doc
+    lazy_command._lazy_module = module_name
+    return lazy_command
+
+def read_manifest(path: Path = MANIFEST_PATH) -> dict:
+    """Reads the cached module -> commands manifest, an unreadable manifest counts as empty"""
+    try:
+        with path.open("r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    return manifest if isinstance(manifest, dict) else {}
+
+def write_manifest(manifest: dict, path: Path = MANIFEST_PATH) -> None:
+    """Saves the manifest, failing to write it only costs a rescan on the next start"""
+    try:
+        with path.open("w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=4)
+    except OSError as e:
+        print("Warning: failed to save command manifest:", e)
+
+def manifest_entry(source: Path, cached: dict | None) -> dict:
+    """Returns the manifest entry for a module, only parsing the source if it changed"""
+    stat = source.stat()
+
+    # entries written before imports were recorded are scanned again
+    if cached is not None and "imports" not in cached:
+        cached = None
+
+    if cached is not None and cached.get("mtime") == stat.st_mtime_ns and cached.get("size") == stat.st_size:
+        return cached
+
+    data = source.read_bytes()
+    digest = hashlib.sha1(data).hexdigest()
+
+    if cached is not None and cached.get("hash") == digest:
+        # touched but not edited
+        return {**cached, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+    commands, imports = scan_module(source)
+    return {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": digest,
+        "commands": commands,
+        "imports": imports
+    }
+
+def scan_package(modules, cached: dict) -> dict:
+    """Builds the manifest for every module of the package, reusing the cached entries that are still valid"""
+    manifest = {}
+
+    for finder, module_name, ispkg in pkgutil.iter_modules(modules.__path__):
+        try:
+            start = perf_counter()
+            entry = manifest_entry(module_source(finder, module_name, ispkg), cached.get(module_name))
+            TIMINGS.record_scan(module_name, perf_counter() - start, entry is cached.get(module_name))
+            manifest[module_name] = entry
+        except Exception as e:
+            # print the error and the traceback so we can debug loading issues
+            print(f"Failed to scan {modules.__name__}.{module_name}: {e}")
+            traceback.print_exc()
+
+    return manifest
+
+def register_module(cli, modules, module_name: str, commands: dict) -> None:
+    """Adds the lazy commands of a module to the CLI class"""
+    for attr, doc in commands.items():
+        setattr(cli, attr, make_lazy_command(cli, modules, module_name, attr, doc))
+
+    if commands:
+        cli._module_map[module_name] = list(commands)
+
+def remove_module(cli, modules, module_name: str) -> bool:
+    """Removes the commands of a module from the CLI class, returns if the module had been imported"""
+    original = getattr(cli, "_original_do_commands", set())
+
+    for attr in cli._module_map.pop(module_name, []):
+        if attr not in original and attr in vars(cli):
+            delattr(cli, attr)
+
+    return sys.modules.pop(f'{modules.__name__}.{module_name}', None) is not None
+
 def load_modules(cli, modules):
-    """Loads the other modules"""
+    """Registers the commands of the other modules, the modules themselves are only imported when used"""
     print("--- Loading ---")
     # record original do_ commands on the class so we don't remove them on unload
     if not hasattr(cli, "_original_do_commands"):
         setattr(cli, "_original_do_commands", {n for n in dir(cli) if n.startswith("do_")})
 
-    if hasattr(cli, "_module_map"):
-        module_map = cli._module_map
-    
-    else:
-        module_map = {}
-        setattr(cli, "_module_map", module_map)
+    if "_module_map" not in vars(cli):
+        setattr(cli, "_module_map", {})
+
+    cached = read_manifest()
+    manifest = scan_package(modules, cached)
 
-    for _, module_name, _ in pkgutil.iter_modules(modules.__path__):
-        functions = []
-        loaded = False
+    for module_name, entry in manifest.items():
         print(module_name, end="...")
-        fullname = f'{modules.__name__}.{module_name}'
+        register_module(cli, modules, module_name, entry["commands"])
 
-        try:
-            if fullname in sys.modules:
-                module = importlib.reload(sys.modules[fullname])
-            else:
-                module = importlib.import_module(fullname)
-
-            # attach any do_ functions from the module to the CLI class
-            for attr in dir(module):
-                if attr.startswith("do_") or attr.startswith("help_"):
-                    func = getattr(module, attr)
-                    if not callable(func):
-                        continue
-
-                    parameters = signature(func).parameters
-
-                    if len(parameters) > 0 and next(iter(parameters)) == "self":
-                        func = MethodType(func, cli)
-
-                    setattr(cli, attr, func)
-                    functions.append(func)
-                    loaded = True
-
-            if loaded:
-                print("OK")
-            else:
-                print("Nothing to load")
-        except Exception as e:
-            # print the error and the traceback so we can debug loading issues
-            print(f"Failed to load {fullname}: {e}")
-            traceback.print_exc()
+        if entry["commands"]:
+            print("OK", end="")
+        else:
+            print("Nothing to load", end="")
+
+        if module_name in TIMINGS.scans:
+            print(f" ({TIMINGS.scans[module_name][0] * 1000:.2f} ms)", end="")
+        print()
+
+    if manifest != cached:
+        write_manifest(manifest)
+
+    setattr(cli, "_manifest", manifest)
+
+def dependents(manifest: dict, changed: set[str]) -> set[str]:
+    """The modules that import one of changed, directly or through other modules"""
+    found = set()
+    pending = set(changed)
+
+    while pending:
+        pending = {name for name, entry in manifest.items()
+                   if name not in changed and name not in found and pending.intersection(entry.get("imports", ()))}
+        found |= pending
+
+    return found
 
-        if functions != []:
-            module_map.update({module_name: [f"{func.__name__}" for func in functions]})
+def reload_modules(cli, modules):
+    """
+    Reloads the modules that were added, removed or edited since they were loaded, and the modules that
+    import one of them, since those still hold the old classes and functions otherwise
+    """
+    print("--- Reloading ---")
+    old = getattr(cli, "_manifest", {})
+    manifest = scan_package(modules, old)
+
+    changed = {module_name for module_name in old.keys() | manifest.keys()
+               if old.get(module_name) is None or manifest.get(module_name) is None
+               or old[module_name]["hash"] != manifest[module_name]["hash"]}
+    affected = dependents(manifest, changed)
+
+    # everything is unloaded first, a dependent imported again must not find an old module in sys.modules
+    was_imported = {module_name: remove_module(cli, modules, module_name) for module_name in sorted(changed | affected)}
+
+    for module_name, imported in was_imported.items():
+        entry = manifest.get(module_name)
+        previous = old.get(module_name)
+        print(module_name, end="...")
+
+        if entry is None:
+            print("Removed")
+            continue
+
+        register_module(cli, modules, module_name, entry["commands"])
+
+        # a module that was in use is imported again right away so errors show up now
+        if imported and not import_module_commands(cli, modules, module_name):
+            continue
+
+        if module_name in affected:
+            print(f"Reloaded (imports {', '.join(sorted((changed | affected).intersection(entry['imports'])))})")
+        else:
+            print("Reloaded" if previous is not None else "Added")
+
+    if manifest != old:
+        write_manifest(manifest)
+
+    setattr(cli, "_manifest", manifest)
+
+    if not changed:
+        print("Nothing changed")
 
 def unload_modules(cli, modules):
     """Unloads the other modules"""
@@ -118,7 +459,7 @@ def unload_modules(cli, modules):
     unloaded_any = False
     # remove any do_ attributes that were not present originally
     for attr_name in list(dir(cli)):
-        if attr_name.startswith('do_') or attr_name.startswith('help_') and attr_name not in original:
+        if (attr_name.startswith('do_') or attr_name.startswith('help_')) and attr_name not in original:
             try:
                 delattr(cli, attr_name)
                 unloaded_any = True
@@ -129,7 +470,8 @@ def unload_modules(cli, modules):
     for name in list(sys.modules.keys()):
         if name.startswith(f'{modules.__name__}.'):
             del sys.modules[name]
-            module_map.pop(f"{name}")
+
+    module_map.clear()
 
     if unloaded_any:
         print("Done")
@@ -138,7 +480,141 @@ def unload_modules(cli, modules):
 
     gc.collect()
             
+def run_batch(shell: cmd.Cmd, lines) -> int:
+    """Runs commands one after another without the prompt, returns 1 if any of them crashed"""
+    failed = False
+
+    for line in lines:
+        line = line.strip()
+        # empty lines would repeat the last command in cmd.Cmd
+        if line == "" or line.startswith("#"):
+            continue
+
+        try:
+            line = shell.precmd(line)
+            stop = shell.postcmd(shell.onecmd(line), line)
+        except Exception:
+            traceback.print_exc()
+            failed = True
+            continue
+
+        if stop:
+            break
+
+    return 1 if failed else 0
+
+def serve(cli, modules, path: Path) -> None:
+    """Keeps one warm CLI running and executes the commands sent to a local unix socket"""
+    import socketserver
+    import io
+
+    if not hasattr(socketserver, "UnixStreamServer"):
+        print("Unix sockets are not supported on this platform")
+        return
+
+    # a warm process is the whole point, so pay for every import once up front
+    for module_name in list(cli._module_map):
+        import_module_commands(cli, modules, module_name)
+
+    shell = cli()
+
+    class CommandHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            output = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+            lines = (raw.decode("utf-8", errors="replace") for raw in self.rfile)
+
+            # cmd.Cmd writes some messages to self.stdout instead of print
+            shell.stdout = output
+            try:
+                with redirect_stdout(output), redirect_stderr(output):
+                    run_batch(shell, lines)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                shell.stdout = sys.stdout
+                output.detach()
+
+    path.unlink(missing_ok=True)
+    with socketserver.UnixStreamServer(str(path), CommandHandler) as server:
+        print(f"Listening on {path}")
+        try:
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+def send_to_server(path: Path, lines) -> int:
+    """Sends commands to a process started with --serve and prints what it answers"""
+    import threading
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError as e:
+            print(f"Couldn't connect to {path}: {e}", file=sys.stderr)
+            return 1
+
+        # send from a thread so a long script can't deadlock against its own output
+        def send():
+            try:
+                for line in lines:
+                    sock.sendall((line.rstrip("\n") + "\n").encode("utf-8"))
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        threading.Thread(target=send, daemon=True).start()
+
+        while chunk := sock.recv(65536):
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+
+    return 0
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Losts funnys CLI. Without options it starts the interactive shell, "
+                    "unless commands are piped in on stdin."
+    )
+    parser.add_argument("-c", "--command", action="append", default=[], help="Run a command and exit (can be repeated)")
+    parser.add_argument("-f", "--file", help="Run the commands in a file (one per line) and exit")
+    parser.add_argument("--serve", nargs="?", const=str(SOCKET_PATH), metavar="SOCKET", help="Stay running and execute commands sent to a unix socket")
+    parser.add_argument("--connect", nargs="?", const=str(SOCKET_PATH), metavar="SOCKET", help="Send the commands to a process started with --serve")
+    return parser.parse_args(argv)
+
+def batch_lines(args: argparse.Namespace):
+    """Returns the commands to run without a prompt, or None for the interactive shell"""
+    if args.command:
+        return args.command
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as file:
+            return file.readlines()
+    if not sys.stdin.isatty():
+        return sys.stdin
+    return None
+
 if __name__ == '__main__':
+    args = parse_args()
+    lines = batch_lines(args)
+
+    if args.connect is not None:
+        exit(send_to_server(Path(args.connect), lines if lines is not None else sys.stdin))
+
+    if args.serve is not None:
+        load_modules(losts_funnys, modules)
+        try:
+            serve(losts_funnys, modules, Path(args.serve))
+        except KeyboardInterrupt:
+            print("Exiting...")
+        exit(0)
+
+    if lines is not None:
+        # keep stdout for the output of the commands
+        with redirect_stdout(sys.stderr):
+            load_modules(losts_funnys, modules)
+        exit(run_batch(losts_funnys(), lines))
+
     load_modules(losts_funnys, modules)
 
     try:
@@ -146,4 +622,4 @@ if __name__ == '__main__':
 
     except KeyboardInterrupt:
         print("Exiting...")
-        exit(0)
\ No newline at end of file
+        exit(0)
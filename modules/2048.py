@@ -1,7 +1,13 @@
-from random import randint, choice
+from random import Random
+from array import array
 from enum import IntEnum
 from typing import List, Union, overload
-from time import sleep
+from functools import cache
+from time import sleep, perf_counter
+import argparse
+import json
+import os
+import sys
 
 class Dir(IntEnum):
     UP = 1
@@ -9,8 +15,114 @@ class Dir(IntEnum):
     LEFT = 3
     RIGHT = 4
 
+#region Bitboard engine
+# A board is a single int: 4 bits per cell holding the exponent of the tile (0 empty, 1 is a 2, 2 a 4, ...).
+# Row y sits in bits 16y to 16y+15 and cell x of a row in the 4 bits at 4x, so a row is a 16 bit
+# number and a move is 4 lookups in the precomputed row tables. Tiles stop merging at 2^15.
+
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15
+
+def _slide_row_left(row: int) -> tuple[int, int]:
+    """Moves one packed row to the left, returns the new row and the score of the merges"""
+    tiles = [tile for tile in ((row >> (4 * i)) & 0xF for i in range(4)) if tile]
+    merged = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] < MAX_EXPONENT:
+            merged.append(tiles[i] + 1)
+            score += 1 << (tiles[i] + 1)
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+
+    result = 0
+    for i, tile in enumerate(merged):
+        result |= tile << (4 * i)
+    return result, score
+
+def reverse_row(row: int) -> int:
+    return (row >> 12) | ((row >> 4) & 0x00F0) | ((row << 4) & 0x0F00) | ((row << 12) & 0xF000)
+
+def _build_tables() -> tuple[array, array, array]:
+    left, right, scores = array("H", bytes(2 << 16)), array("H", bytes(2 << 16)), array("L", [0]) * (1 << 16)
+    for row in range(1 << 16):
+        result, score = _slide_row_left(row)
+        left[row] = result
+        right[reverse_row(row)] = reverse_row(result)
+        scores[row] = score
+    return left, right, scores
+
+# LEFT_TABLE[row] is row moved left, RIGHT_TABLE[row] moved right, the score is the same both ways
+LEFT_TABLE, RIGHT_TABLE, SCORE_TABLE = _build_tables()
+
+def transpose(board: int) -> int:
+    """Swaps rows and columns, so up and down become left and right"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def slide(board: int, dir: "Dir") -> tuple[int, int]:
+    """Moves the whole board, returns the new board and the score of the merges"""
+    vertical = dir == Dir.UP or dir == Dir.DOWN
+    if vertical:
+        board = transpose(board)
+    table = LEFT_TABLE if dir == Dir.UP or dir == Dir.LEFT else RIGHT_TABLE
+
+    result = score = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        result |= table[row] << shift
+        score += SCORE_TABLE[row]
+
+    return (transpose(result) if vertical else result), score
+
+def all_moves(board: int) -> tuple[int, int, int, int]:
+    """The boards after UP, DOWN, LEFT and RIGHT (same order as Dir), with a single transpose"""
+    left_table, right_table = LEFT_TABLE, RIGHT_TABLE
+    columns = transpose(board)
+    up = down = left = right = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        left |= left_table[row] << shift
+        right |= right_table[row] << shift
+        column = (columns >> shift) & ROW_MASK
+        up |= left_table[column] << shift
+        down |= right_table[column] << shift
+    return transpose(up), transpose(down), left, right
+
+def empty_cells(board: int) -> list[int]:
+    """Bit offsets of the empty cells"""
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & 0xF]
+
+def can_move(board: int) -> bool:
+    """Whether any move still changes the board"""
+    return any(new != board for new in all_moves(board))
+
+def pack(rows: List[List[int]]) -> int:
+    """Packs a 4x4 list of tile values (0, 2, 4, ...) into a board"""
+    board = 0
+    for y, row in enumerate(rows):
+        for x, value in enumerate(row):
+            if value:
+                board |= (value.bit_length() - 1) << (16 * y + 4 * x)
+    return board
+
+def unpack(board: int) -> List[List[int]]:
+    """The tile values of a board as a 4x4 list of lists"""
+    return [[(1 << tile) if (tile := (board >> (16 * y + 4 * x)) & 0xF) else 0 for x in range(4)] for y in range(4)]
+
+#endregion
+
 class Board(list):
-    invalid_move = False
+    """List of lists view (board[y][x] holds the tile value) of a packed board, for reading and building boards"""
 
     @overload
     def __init__(self, initial_board: List[List[int]]) -> None: ...
@@ -21,130 +133,241 @@ class Board(list):
         super().__init__()
         if len(args) == 1 and isinstance(args[0], list):
             # Case: Board(initial_board)
-            self.extend(args[0])
+            self.extend(list(row) for row in args[0])
         else:
             # Case: Board(rows, cols, default_value)
             if len(args) == 2 or len(args) == 3:
                 rows, cols = args[0], args[1]
                 default_value = args[2] if len(args) == 3 else None
                 self.extend([[default_value for _ in range(cols)] for _ in range(rows)])
-    
-    def rotate(self, direction: str = "right"):
-        """Rotates the board in the specified direction"""
-        N = len(self)
 
-        if direction == "right":
-            rotated = [list(row) for row in zip(*self[::-1])]
+#region Flat engine
+# Boards other than 4x4: the exponents in one flat bytearray (index y * size + x), moved in place.
+# The empty cells are kept in a list (with each cell's slot in it), so a new tile is placed in O(1).
 
-        elif direction == "left":
-            rotated = [list(row) for row in zip(*[row[::-1] for row in self])]
+MIN_SIZE = 3
+MAX_SIZE = 8
+NOT_EMPTY = 0xFF
 
-        else:
-            raise ValueError("Invalid direction. Use 'right' or 'left'.")
+@cache
+def board_lines(size: int) -> dict:
+    """For every direction the cell indices of each line, starting at the side the tiles move to"""
+    rows = [tuple(range(y * size, (y + 1) * size)) for y in range(size)]
+    columns = [tuple(range(x, size * size, size)) for x in range(size)]
+    return {
+        Dir.UP: tuple(columns),
+        Dir.DOWN: tuple(column[::-1] for column in columns),
+        Dir.LEFT: tuple(rows),
+        Dir.RIGHT: tuple(row[::-1] for row in rows),
+    }
 
-        self.clear()
-        self.extend(rotated)
-        return self
+@cache
+def neighbor_pairs(size: int) -> tuple[tuple[int, int], ...]:
+    """Every pair of horizontally or vertically adjacent cells"""
+    return tuple((i, i + 1) for i in range(size * size) if (i + 1) % size) + \
+           tuple((i, i + size) for i in range(size * (size - 1)))
 
-    def reverse(self):
-        super().reverse()
-        return self
-    
-    def merge_tiles(self):
-        for x in range(len(self[0])):
-            column = [self[y][x] for y in range(len(self))]
-            cleaned = [num for num in column if num != 0]
-            cleaned.extend([0] * (len(column) - len(cleaned)))
-            new_column = []
-            i = 0
-            while i < len(cleaned):
-                if i + 1 < len(cleaned) and cleaned[i] == cleaned[i + 1] and cleaned[i] != 0:
-                    new_column.append(cleaned[i] * 2)
-                    i += 2
+class FlatBoard:
+    def __init__(self, size: int = 4):
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f"Board size has to be between {MIN_SIZE} and {MAX_SIZE}")
+        self.size = size
+        self.cells = bytearray(size * size)
+        self.lines = board_lines(size)
+        self.empty = list(range(size * size))
+        self.slot = bytearray(range(size * size))
+
+    def copy(self) -> "FlatBoard":
+        board = FlatBoard.__new__(FlatBoard)
+        board.size, board.lines = self.size, self.lines
+        board.cells, board.empty, board.slot = bytearray(self.cells), self.empty.copy(), bytearray(self.slot)
+        return board
+
+    def _emptied(self, index: int):
+        self.slot[index] = len(self.empty)
+        self.empty.append(index)
+
+    def _filled(self, index: int):
+        # swap remove: the last empty cell takes the slot of this one
+        slot = self.slot[index]
+        last = self.empty.pop()
+        if last != index:
+            self.empty[slot] = last
+            self.slot[last] = slot
+        self.slot[index] = NOT_EMPTY
+
+    def place(self, index: int, exponent: int):
+        """Puts a tile on an empty cell"""
+        self.cells[index] = exponent
+        self._filled(index)
+
+    def random_tile(self, rng: Random, choices: List[int]):
+        if self.empty:
+            self.place(self.empty[rng.randrange(len(self.empty))], rng.choice(choices).bit_length() - 1)
+
+    def move(self, dir: Dir) -> int | None:
+        """Moves the tiles in place, returns the score of the merges or None if nothing moved"""
+        cells = self.cells
+        score = 0
+        moved = False
+
+        for line in self.lines[dir]:
+            write = 0  # next free position in line
+            last = 0  # the tile before write, if it can still merge
+            for read in line:
+                value = cells[read]
+                if not value:
+                    continue
+                if value == last:
+                    cells[line[write - 1]] = value + 1
+                    cells[read] = 0
+                    self._emptied(read)
+                    score += 1 << (value + 1)
+                    last = 0
+                    moved = True
+                    continue
+
+                target = line[write]
+                if target != read:
+                    cells[target] = value
+                    cells[read] = 0
+                    self._filled(target)
+                    self._emptied(read)
+                    moved = True
+                write += 1
+                last = value
+
+        return score if moved else None
+
+    def can_slide(self, dir: Dir) -> bool:
+        """Whether moving in dir would change anything, without moving"""
+        cells = self.cells
+        for line in self.lines[dir]:
+            gap = False
+            last = 0
+            for index in line:
+                value = cells[index]
+                if not value:
+                    gap = True
+                elif gap or value == last:
+                    return True
                 else:
-                    if cleaned[i] != 0:
-                        new_column.append(cleaned[i])
-                    i += 1
-            while len(new_column) < len(cleaned):
-                new_column.append(0)
-            for y in range(len(self)):
-                self[y][x] = new_column[y]
-        return self
-    
+                    last = value
+        return False
+
+    def can_move(self) -> bool:
+        if self.empty:
+            return True
+        cells = self.cells
+        return any(cells[a] == cells[b] for a, b in neighbor_pairs(self.size))
+
+    def max_tile(self) -> int:
+        return 1 << max(self.cells) if any(self.cells) else 0
+
+    def rows(self) -> List[List[int]]:
+        size = self.size
+        return [[(1 << tile) if tile else 0 for tile in self.cells[y * size:(y + 1) * size]] for y in range(size)]
+
+    def load(self, rows: List[List[int]]):
+        """Replaces the tiles with a list of lists of tile values"""
+        if len(rows) != self.size or any(len(row) != self.size for row in rows):
+            raise ValueError(f"Expected a {self.size}x{self.size} board")
+        self.cells[:] = bytes(value.bit_length() - 1 if value else 0 for row in rows for value in row)
+        self.empty = [i for i, tile in enumerate(self.cells) if not tile]
+        self.slot[:] = bytes([NOT_EMPTY]) * len(self.cells)
+        for slot, index in enumerate(self.empty):
+            self.slot[index] = slot
+
+    def clear(self):
+        self.load([[0] * self.size for _ in range(self.size)])
+
+#endregion
+
 class Game:
     choices = [2, 4]
 
-    def __init__(self) -> None:
+    def __init__(self, state: int | None = None, rng: Random | None = None, size: int = 4) -> None:
+        """4x4 games run on the packed board (state), other sizes on a FlatBoard (flat)"""
+        self.rng = rng if rng is not None else Random()
+        self.size = size
+        self.flat = FlatBoard(size) if size != 4 else None
+        self.score = 0
+        self.invalid_move = False
+        if state is not None:
+            self.state = state
+            return
+
         self.reset()
         self.random_tile()
         self.random_tile()
-    
-    def move(self, dir: Dir):
-        """Make a permanent move to the board"""
-        save = self.board.copy()
 
-        if dir == Dir.DOWN:
-            self.board.reverse().merge_tiles().reverse()
-            return
+    @property
+    def board(self) -> Board:
+        """The board as a list of lists of tile values, changing it doesn't change the game"""
+        return Board(self.flat.rows() if self.flat else unpack(self.state))
 
-        elif dir == Dir.LEFT:
-            self.board.rotate().merge_tiles().rotate("left")
-            return
-        
-        elif dir == Dir.RIGHT:
-            self.board.rotate().reverse().merge_tiles().reverse().rotate("left")
-            return
-            
-        self.board.merge_tiles()
-        
-        if self.board == save: # The move did nothing
-            self.board.invalid_move = True
-    
-    def simulate_move(self, dir: str):
-        # Copys the current board and makes the move allowing to check for invalid moves
-        ...
+    @board.setter
+    def board(self, board: List[List[int]]):
+        if self.flat:
+            self.flat.load(board)
+        else:
+            self.state = pack(board)
+
+    def move(self, dir: Dir) -> bool:
+        """Make a permanent move to the board, returns whether anything moved"""
+        if self.flat:
+            score = self.flat.move(dir)
+            self.invalid_move = score is None
+            self.score += score or 0
+            return not self.invalid_move
+
+        state, score = slide(self.state, dir)
+        # The move did nothing
+        self.invalid_move = state == self.state
+        self.state = state
+        self.score += score
+        return not self.invalid_move
+
+    def simulate_move(self, dir: Dir) -> "int | FlatBoard":
+        """The board the move would lead to (the same one if the move is invalid), the game isn't changed"""
+        if self.flat:
+            board = self.flat.copy()
+            board.move(dir)
+            return board
+        return slide(self.state, dir)[0]
 
     def check_loss(self):
-        # Check if there are any more valid moves by simulation every next move after a user move
-        for y in range(4):
-            for x in range(4):
-                if self.board[y][x] == 0:
-                    return False
-
-        moves = []
-        temp = Game()
-        for dir in [Dir.UP, Dir.DOWN, Dir.LEFT, Dir.RIGHT]:
-            temp.board = Board(self.board)
-            temp.move(dir)
-
-            if not temp.board.invalid_move:
-                moves.append(True)
-
-        if any(moves):
-            return False
-        
-        return True                        
+        # Lost once no move changes the board anymore
+        return not (self.flat.can_move() if self.flat else can_move(self.state))
+
+    def max_tile(self) -> int:
+        if self.flat:
+            return self.flat.max_tile()
+        return max(max(row) for row in unpack(self.state))
 
     def to_string(self):
+        line = " " + " ".join(["---"] * self.size) + "\n"
         s = ""
         for row in self.board:
-            s += f" --- --- --- ---\n| {row[0]} | {row[1]} | {row[2]} | {row[3]} |\n"
-        s += " --- --- --- ---\n"
+            s += line + "| " + " | ".join(map(str, row)) + " |\n"
+        s += line
         return s
 
     def reset(self):
-        self.board = Board(4, 4, 0)
+        if self.flat:
+            self.flat.clear()
+        self.state = 0
+        self.score = 0
     
     def random_tile(self):
-        empty = []
-        for y in range(4):
-            for x in range(4):
-                if self.board[y][x] == 0:
-                    empty.append((y, x))
-        
+        if self.flat:
+            self.flat.random_tile(self.rng, self.choices)
+            return
+
+        empty = empty_cells(self.state)
         if empty:
-            pos = choice(empty)
-            self.board[pos[0]][pos[1]] = choice(self.choices)
+            tile = self.rng.choice(self.choices).bit_length() - 1
+            self.state |= tile << self.rng.choice(empty)
 
     def tick(self, dir: str):
         match dir:
@@ -157,36 +380,543 @@ class Game:
             case "right":
                 self.move(Dir.RIGHT)
 
-def do_2048(self):
-    return
+#region Solver
+# Weights of the row heuristic used by the well known expectimax 2048 bots: empty cells and
+# possible merges are good, rows that aren't monotonic and many big tiles are bad
+LOST_PENALTY = 200000.0
+EMPTY_WEIGHT = 270.0
+MERGES_WEIGHT = 700.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+
+# Chance nodes less likely than this are only estimated with the heuristic
+MIN_PROBABILITY = 0.0001
+MAX_DEPTH = 8
+
+@cache
+def heuristic_table() -> array:
+    """Heuristic value of every packed row, a board is scored as the sum over its rows and columns"""
+    table = array("d", bytes(8 << 16))
+    for row in range(1 << 16):
+        tiles = [(row >> (4 * i)) & 0xF for i in range(4)]
+
+        merges = 0
+        previous = counter = 0
+        for tile in tiles:
+            if not tile:
+                continue
+            if tile == previous:
+                counter += 1
+            elif counter:
+                merges += 1 + counter
+                counter = 0
+            previous = tile
+        if counter:
+            merges += 1 + counter
+
+        monotonic_left = monotonic_right = 0.0
+        for a, b in zip(tiles, tiles[1:]):
+            if a > b:
+                monotonic_left += a ** MONOTONICITY_POWER - b ** MONOTONICITY_POWER
+            else:
+                monotonic_right += b ** MONOTONICITY_POWER - a ** MONOTONICITY_POWER
+
+        table[row] = (LOST_PENALTY + EMPTY_WEIGHT * tiles.count(0) + MERGES_WEIGHT * merges
+                      - MONOTONICITY_WEIGHT * min(monotonic_left, monotonic_right)
+                      - SUM_WEIGHT * sum(tile ** SUM_POWER for tile in tiles))
+    return table
+
+def evaluate(board: int) -> float:
+    table = heuristic_table()
+    columns = transpose(board)
+    return (table[board & ROW_MASK] + table[(board >> 16) & ROW_MASK] + table[(board >> 32) & ROW_MASK] + table[board >> 48]
+            + table[columns & ROW_MASK] + table[(columns >> 16) & ROW_MASK] + table[(columns >> 32) & ROW_MASK] + table[columns >> 48])
+
+class SearchTimeout(Exception):
+    pass
+
+class Expectimax:
+    """
+    Expectimax search: the player picks the best move, the game places a random tile (chance node, averaged
+    over every empty cell and tile). Deepens one level at a time until the time budget is used up.
+    Chance nodes are cached in a transposition table keyed on the packed board.
+    """
+
+    def __init__(self, choices: List[int] = Game.choices):
+        # exponent and probability of each new tile
+        self.spawns = [(value.bit_length() - 1, choices.count(value) / len(choices)) for value in set(choices)]
+        heuristic_table()  # build it before the clock runs
+        self.cache = {}
+        self.evaluated = 0
+        self.depth = 0
+        self.deadline = None
+
+    def best_move(self, board: int, time_ms: float | None = 50, max_depth: int = MAX_DEPTH) -> Dir | None:
+        """
+        Best move for board, None if no move is possible anymore.
+        Without time_ms it always searches max_depth deep, which makes it deterministic.
+        """
+        moves = [(dir, new) for dir, new in zip(Dir, all_moves(board)) if new != board]
+        if len(moves) <= 1:
+            return moves[0][0] if moves else None
+
+        self.deadline = perf_counter() + time_ms / 1000 if time_ms is not None else float("inf")
+        self.cache.clear()
+        best = moves[0][0]
+        for depth in range(1, max_depth + 1):
+            try:
+                values = [(self._chance(new, depth, 1.0), dir) for dir, new in moves]
+            except SearchTimeout:
+                break
+            best = max(values)[1]
+            self.depth = depth
+            if perf_counter() > self.deadline:
+                break
+        return best
+
+    def _max(self, board: int, depth: int, probability: float) -> float:
+        best = 0.0  # no move left: lost, worse than any heuristic value
+        for new in all_moves(board):
+            if new != board:
+                value = self._chance(new, depth - 1, probability)
+                if value > best:
+                    best = value
+        return best
+
+    def _chance(self, board: int, depth: int, probability: float) -> float:
+        if depth <= 0 or probability < MIN_PROBABILITY:
+            self.evaluated += 1
+            if not self.evaluated & 1023 and perf_counter() > self.deadline:
+                raise SearchTimeout
+            return evaluate(board)
+
+        cached = self.cache.get(board)
+        if cached is not None and cached[0] >= depth:
+            return cached[1]
+
+        empty = empty_cells(board)
+        if not empty:
+            return self._max(board, depth, probability)
+
+        total = 0.0
+        for shift in empty:
+            for tile, chance in self.spawns:
+                total += chance * self._max(board | tile << shift, depth, probability * chance / len(empty))
+        value = total / len(empty)
+
+        self.cache[board] = (depth, value)
+        return value
+
+def best_move(board: int | List[List[int]], time_ms: float = 50) -> Dir | None:
+    """Best move for a packed board (or a list of lists of tile values), None if the game is lost"""
+    if isinstance(board, list):
+        board = pack(board)
+    return Expectimax().best_move(board, time_ms)
+
+#endregion
+
+#region Self-play
+
+POLICIES = ("random", "greedy", "expectimax")
+
+def choose_move(policy: str, board: int, rng: Random, depth: int = 2, solver: Expectimax | None = None) -> Dir | None:
+    """The move a policy makes, None once the game is lost"""
+    moves = [(dir, new) for dir, new in zip(Dir, all_moves(board)) if new != board]
+    if not moves:
+        return None
+
+    match policy:
+        case "random":
+            return rng.choice(moves)[0]
+        case "greedy":
+            # most points right now, the most empty cells after that
+            return max(moves, key=lambda move: (slide(board, move[0])[1], len(empty_cells(move[1]))))[0]
+        case "expectimax":
+            return (solver or Expectimax()).best_move(board, None, depth)
+    raise ValueError(f"Unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+
+def choose_flat_move(policy: str, board: FlatBoard, rng: Random) -> Dir | None:
+    """choose_move for boards other than 4x4, there is no expectimax for those"""
+    if policy == "expectimax":
+        raise ValueError("The expectimax policy only plays 4x4 boards")
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+
+    if policy == "random":
+        moves = [dir for dir in Dir if board.can_slide(dir)]
+        return rng.choice(moves) if moves else None
+
+    moves = []
+    for dir in Dir:
+        moved = board.copy()
+        score = moved.move(dir)
+        if score is not None:
+            moves.append((dir, score, len(moved.empty)))
+    if not moves:
+        return None
+    return max(moves, key=lambda move: move[1:])[0]
+
+def play_game(policy: str, seed: int | str, depth: int = 2, size: int = 4, max_moves: int | None = None) -> dict:
+    """
+    Plays one whole game without any output, the same seed plays the same game.
+    max_moves stops games early, random play on big boards goes on for a very long time.
+    """
+    rng = Random(seed)
+    game = Game(rng=rng, size=size)
+    solver = Expectimax() if policy == "expectimax" else None
+    moves = 0
+    began = perf_counter()
+
+    while max_moves is None or moves < max_moves:
+        if game.flat:
+            dir = choose_flat_move(policy, game.flat, rng)
+        else:
+            dir = choose_move(policy, game.state, rng, depth, solver)
+        if dir is None:
+            break
+        game.move(dir)
+        game.random_tile()
+        moves += 1
+
+    return {
+        "seed": seed,
+        "score": game.score,
+        "max_tile": game.max_tile(),
+        "moves": moves,
+        "finished": game.check_loss(),
+        "seconds": perf_counter() - began,
+    }
+
+def _play_game(args):
+    return play_game(*args)
+
+def simulate(games: int, policy: str = "random", seed: int = 0, depth: int = 2, processes: int | None = None,
+             size: int = 4, max_moves: int | None = None) -> dict:
+    """
+    Plays games games with a policy and sums them up. Game i is seeded with "{seed}-{i}", so a report can be
+    reproduced. The games are spread over a process pool (processes=None uses every core, 1 stays in this process).
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+    if policy == "expectimax" and size != 4:
+        raise ValueError("The expectimax policy only plays 4x4 boards")
+    if not MIN_SIZE <= size <= MAX_SIZE:
+        raise ValueError(f"Board size has to be between {MIN_SIZE} and {MAX_SIZE}")
+    if games < 0:
+        raise ValueError("The number of games can't be negative")
+    if depth < 0:
+        raise ValueError("The search depth can't be negative")
+    if max_moves is not None and max_moves < 0:
+        raise ValueError("The move limit can't be negative")
+
+    jobs = [(policy, f"{seed}-{i}", depth, size, max_moves) for i in range(games)]
+    began = perf_counter()
+
+    if processes == 1 or games < 2:
+        results = [_play_game(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = processes or os.cpu_count() or 1
+        # random games take milliseconds, big chunks keep the workers from waiting on the pipe
+        chunksize = max(1, games // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_play_game, jobs, chunksize=chunksize))
+
+    elapsed = perf_counter() - began
+    scores = sorted(result["score"] for result in results)
+    tiles = {}
+    for result in results:
+        tiles[result["max_tile"]] = tiles.get(result["max_tile"], 0) + 1
+    moves = sum(result["moves"] for result in results)
+
+    return {
+        "policy": policy,
+        "games": games,
+        "seed": seed,
+        "depth": depth if policy == "expectimax" else None,
+        "size": size,
+        "unfinished": sum(not result["finished"] for result in results),
+        "score_mean": sum(scores) / games if games else 0,
+        "score_median": scores[games // 2] if games else 0,
+        "score_min": scores[0] if games else 0,
+        "score_max": scores[-1] if games else 0,
+        "max_tiles": dict(sorted(tiles.items())),
+        "moves": moves,
+        "seconds": elapsed,
+        "moves_per_s": moves / elapsed if elapsed else 0.0,
+        "games_per_s": games / elapsed if elapsed else 0.0,
+        "results": results,
+    }
+
+def print_report(report: dict):
+    games = report["games"]
+    depth = f" (depth {report['depth']})" if report["depth"] else ""
+    print(f"{games} games on {report['size']}x{report['size']} with the {report['policy']} policy{depth} in {report['seconds']:.1f}s")
+    if report["unfinished"]:
+        print(f"{report['unfinished']} games stopped at the move limit")
+    print(f"Score: mean {report['score_mean']:.0f}, median {report['score_median']}, min {report['score_min']}, max {report['score_max']}")
+    print("Highest tile:")
+    for tile, count in report["max_tiles"].items():
+        print(f"  {tile:>6} {count:>6} ({count / games:.1%})")
+    print(f"{report['moves_per_s']:.0f} moves/s, {report['games_per_s']:.2f} games/s")
+
+#endregion
+
+#region Terminal play
+
+# raw key sequences: arrows (POSIX escape sequences and the msvcrt prefixed codes) and WASD
+KEYS = {
+    "\x1b[A": Dir.UP, "\x1b[B": Dir.DOWN, "\x1b[D": Dir.LEFT, "\x1b[C": Dir.RIGHT,
+    "\x1bOA": Dir.UP, "\x1bOB": Dir.DOWN, "\x1bOD": Dir.LEFT, "\x1bOC": Dir.RIGHT,
+    "\xe0H": Dir.UP, "\xe0P": Dir.DOWN, "\xe0K": Dir.LEFT, "\xe0M": Dir.RIGHT,
+    "w": Dir.UP, "s": Dir.DOWN, "a": Dir.LEFT, "d": Dir.RIGHT,
+}
+CELL_WIDTH = 6
+
+class RawKeys:
+    """Reads single key presses without waiting for enter (termios on POSIX, msvcrt on Windows)"""
+
+    def __enter__(self):
+        try:
+            import termios, tty
+        except ImportError:
+            import msvcrt
+            self.msvcrt = msvcrt
+            return self
+
+        self.msvcrt = None
+        self.buffer = ""
+        self.fd = sys.stdin.fileno()
+        self.saved = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, *exc):
+        if self.msvcrt is None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+
+    def read(self, timeout: float | None = None) -> str | None:
+        """The next key (a whole escape sequence for arrows), None if nothing was pressed within timeout"""
+        if self.msvcrt is not None:
+            deadline = None if timeout is None else perf_counter() + timeout
+            while not self.msvcrt.kbhit():
+                if deadline is not None and perf_counter() >= deadline:
+                    return None
+                sleep(0.005)  # msvcrt can't wait for a key with a timeout
+            key = self.msvcrt.getwch()
+            if key in "\x00\xe0":
+                return "\xe0" + self.msvcrt.getwch()
+            return key
+
+        if not self.buffer:
+            import select
+            if not select.select([self.fd], [], [], timeout)[0]:
+                return None
+            # fast typing can deliver several keys in one read, they are handed out one by one
+            self.buffer = os.read(self.fd, 64).decode(errors="ignore")
+
+        length = 3 if self.buffer[:2] in ("\x1b[", "\x1bO") else 1
+        key, self.buffer = self.buffer[:length], self.buffer[length:]
+        return key
+
+class TileView:
+    """
+    Draws a board in the terminal. The first frame draws the whole grid, after that only the tiles
+    that changed and the status line are rewritten in place (ANSI cursor moves), so nothing flickers.
+    """
+
+    def __init__(self, size: int, out=None):
+        self.size = size
+        self.out = out
+        self.tiles = None
+
+    def draw(self, rows: List[List[int]], status: str = ""):
+        out = self.out or sys.stdout
+        size = self.size
+        parts = []
+
+        if self.tiles is None:
+            line = "+" + "+".join(["-" * CELL_WIDTH] * size) + "+"
+            empty = "|" + "|".join([" " * CELL_WIDTH] * size) + "|"
+            parts.append("\x1b[2J\x1b[H\x1b[?25l" + "\n".join([line, *[empty, line] * size]))
+            self.tiles = [[None] * size for _ in range(size)]
+
+        for y, row in enumerate(rows):
+            for x, value in enumerate(row):
+                if self.tiles[y][x] != value:
+                    self.tiles[y][x] = value
+                    parts.append(f"\x1b[{2 * y + 2};{x * (CELL_WIDTH + 1) + 2}H{str(value or '').center(CELL_WIDTH)}")
+
+        parts.append(f"\x1b[{2 * size + 3};1H{status}\x1b[K")
+        out.write("".join(parts))
+        out.flush()
+
+    def close(self):
+        out = self.out or sys.stdout
+        out.write(f"\x1b[{2 * self.size + 4};1H\x1b[?25h")
+        out.flush()
+
+def play(size: int = 4, hint_ms: float = 200):
+    """
+    Plays 2048 in the terminal: arrows or WASD move, h asks the AI for a hint, n starts over, q quits.
+    The hint is computed in a worker process, keys and redraws keep going while it thinks.
+    """
+    game = Game(size=size)
+    view = TileView(size)
+    executor = None
+    pending = None  # (future, board it was asked for)
+    hint = ""
+    message = ""
+
+    def status():
+        text = f"Score {game.score}"
+        if hint:
+            text += f"  hint: {hint}"
+        if message:
+            text += f"  {message}"
+        return text + "   (arrows/WASD, h hint, n new game, q quit)"
+
+    try:
+        with RawKeys() as keys:
+            view.draw(game.board, status())
+            while True:
+                key = keys.read(0.02 if pending else None)
+
+                if pending and pending[0].done():
+                    future, board = pending
+                    pending = None
+                    if board == game.state:
+                        dir = future.result()
+                        hint = dir.name.lower() if dir is not None else "none"
+                        view.draw(game.board, status())
+
+                if key is None:
+                    continue
+                if key in ("q", "\x1b"):
+                    break
+
+                if key == "n":
+                    game = Game(size=size)
+                    hint = message = ""
+                elif key == "h":
+                    if size != 4:
+                        message = "hints only for 4x4"
+                    elif not pending:
+                        if executor is None:
+                            from concurrent.futures import ProcessPoolExecutor
+                            executor = ProcessPoolExecutor(max_workers=1)
+                        pending = (executor.submit(best_move, game.state, hint_ms), game.state)
+                        hint = "thinking..."
+                elif key in KEYS:
+                    if game.check_loss():
+                        continue
+                    if game.move(KEYS[key]):
+                        game.random_tile()
+                        hint = message = ""
+                        if game.check_loss():
+                            message = f"You lost, highest tile {game.max_tile()}"
+                    else:
+                        message = "Invalid move"
+
+                view.draw(game.board, status())
+    finally:
+        view.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    print(f"Score {game.score}, highest tile {game.max_tile()}")
+
+#endregion
+
+parser = argparse.ArgumentParser(prog="2048", exit_on_error=False, add_help=False)
+parser.add_argument("--auto", action="store_true")
+parser.add_argument("--time", type=float, default=50, metavar="MS")
+parser.add_argument("--show", action="store_true")
+parser.add_argument("--simulate", type=int, metavar="GAMES")
+parser.add_argument("--policy", choices=POLICIES, default="random")
+parser.add_argument("--depth", type=int, default=2)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--processes", type=int)
+parser.add_argument("--json", action="store_true")
+parser.add_argument("--size", type=int, default=4)
+parser.add_argument("--max-moves", type=int)
+
+def do_2048(self, args):
+    """
+    The game 2048
+
+    Usage: 2048 [--size N] [--time MS]
+           2048 --auto [--time MS] [--show]
+           2048 --simulate GAMES [--policy random|greedy|expectimax] [--depth N] [--seed N] [--processes N] [--json]
+                [--size N] [--max-moves N]
+        (no option) play in the terminal: arrows or WASD move, h shows a hint, n starts over, q quits
+        --auto      let the expectimax AI play a game
+        --time      thinking time per move (or hint) in milliseconds (default 50)
+        --show      print the board after every move, not only at the end
+        --simulate  play GAMES games without output and report how the policy did
+        --policy    how the simulated games pick their moves (default random)
+        --depth     search depth of the expectimax policy (default 2)
+        --seed      play the same games again
+        --processes number of worker processes (default one per core)
+        --json      print the whole report (every game) as JSON
+        --size      board size, 3 to 8 (hints and expectimax only for 4)
+        --max-moves stop each simulated game after this many moves
+    """
+    try:
+        parsed_args = parser.parse_args(args.split())
+    except (argparse.ArgumentError, SystemExit) as e:
+        print(getattr(e, "message", "Invalid arguments"))
+        return
+
+    if parsed_args.simulate is not None:
+        try:
+            report = simulate(parsed_args.simulate, parsed_args.policy, parsed_args.seed, parsed_args.depth,
+                              parsed_args.processes, parsed_args.size, parsed_args.max_moves)
+        except ValueError as e:
+            print(e)
+            return
+        if parsed_args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+        return
+
+    if not parsed_args.auto:
+        if not sys.stdin.isatty() or not sys.stdout.isatty():
+            print("Playing needs an interactive terminal, try 2048 --auto or 2048 --simulate")
+            return
+        if not MIN_SIZE <= parsed_args.size <= MAX_SIZE:
+            print(f"Board size has to be between {MIN_SIZE} and {MAX_SIZE}")
+            return
+        play(parsed_args.size, parsed_args.time)
+        return
+
+    game = Game()
+    solver = Expectimax()
+    moves = 0
+    began = perf_counter()
+    try:
+        while (dir := solver.best_move(game.state, parsed_args.time)) is not None:
+            game.move(dir)
+            game.random_tile()
+            moves += 1
+            if parsed_args.show:
+                print(f"{dir.name} (depth {solver.depth}), score {game.score}")
+                print(game.to_string())
+    except KeyboardInterrupt:
+        print("Stopped")
+
+    elapsed = perf_counter() - began
+    print(game.to_string())
+    print(f"Score {game.score}, highest tile {max(max(row) for row in game.board)}, {moves} moves in {elapsed:.1f}s")
+    print(f"{solver.evaluated / elapsed:.0f} positions evaluated per second")
 
 def help_2048(self):
-    print("Not implemented yet")
+    print(do_2048.__doc__)
 
 if __name__ == "__main__":
-    g = Game()
-
-    while True:
-        print(g.to_string())
-        direction = input("Direction> ")
-
-        match direction:
-            case "u":
-                g.tick("up")
-            case "d":
-                g.tick("down")
-            case "l":
-                g.tick("left")
-            case "r":
-                g.tick("right")
-        
-        if g.board.invalid_move:
-            print("Invalid Move")
-            sleep(0.75)
-            continue
-
-        g.random_tile()
-
-        if g.check_loss():
-            print("You lost")
-            break
+    play()
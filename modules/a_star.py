@@ -1,6 +1,116 @@
 from heapq import heappop, heappush
+from collections import deque
+from itertools import permutations
 from operator import sub
+from array import array
+import argparse
+import os
 import random
+import shutil
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SQRT2 = 2 ** 0.5
+
+ALGORITHMS = ("astar", "jps", "hpa")
+GENERATORS = ("random", "maze", "cave", "solvable")
+
+
+class Grid:
+    """
+    A grid stored as one flat bytearray (0 free, 1 obstacle), cells are addressed by a single integer index.
+    The grid is padded with a border of obstacles, so an index plus any of the neighbor
+    offsets always stays inside the array and never needs a bounds check.
+    """
+    FREE = 0
+    OBSTACLE = 1
+
+    def __init__(self, width: int, height: int, cells: bytearray | None = None):
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+
+        if cells is None:
+            cells = bytearray(self.stride * (height + 2))
+            self._fill_border(cells)
+        elif len(cells) != self.stride * (height + 2):
+            raise ValueError("cells doesn't match the padded grid size")
+
+        self.cells = cells
+        s = self.stride
+        # same order as get_neighbors_pos
+        self.offsets = (-s - 1, -s, -s + 1, -1, 1, s - 1, s, s + 1)
+
+    def _fill_border(self, cells: bytearray):
+        s = self.stride
+        cells[0:s] = b"\x01" * s
+        cells[len(cells) - s:] = b"\x01" * s
+        cells[0::s] = b"\x01" * (self.height + 2)
+        cells[s - 1::s] = b"\x01" * (self.height + 2)
+
+    @classmethod
+    def from_rows(cls, rows: list[list[int]]) -> "Grid":
+        """Adapter for the old list of lists grids (grid[y][x])"""
+        height = len(rows)
+        width = len(rows[0]) if height else 0
+        grid = cls(width, height)
+
+        for y, row in enumerate(rows):
+            start = grid.index((0, y))
+            grid.cells[start:start + width] = bytes(map(bool, row))
+
+        return grid
+
+    def to_rows(self) -> list[list[int]]:
+        """Converts back into a list of lists grid (grid[y][x])"""
+        rows = []
+        for y in range(self.height):
+            start = self.index((0, y))
+            rows.append(list(self.cells[start:start + self.width]))
+        return rows
+
+    def index(self, pos: tuple[int, int]) -> int:
+        return (pos[1] + 1) * self.stride + pos[0] + 1
+
+    def pos(self, index: int) -> tuple[int, int]:
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def in_bounds(self, pos: tuple[int, int]) -> bool:
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def __getitem__(self, pos: tuple[int, int]) -> int:
+        return self.cells[self.index(pos)]
+
+    def __setitem__(self, pos: tuple[int, int], value: int):
+        if not self.in_bounds(pos):
+            raise IndexError(f"{pos} is outside of the grid")
+        self.cells[self.index(pos)] = 1 if value else 0
+
+    def neighbors(self, index: int) -> list[int]:
+        """Indices of the free neighbors of a cell"""
+        cells = self.cells
+        return [n for n in (index + o for o in self.offsets) if cells[n] == 0]
+
+    def copy(self) -> "Grid":
+        return Grid(self.width, self.height, bytearray(self.cells))
+
+    def __len__(self):
+        return self.height
+
+    def __repr__(self):
+        return f"Grid({self.width}x{self.height})"
+
+def as_grid(grid) -> Grid:
+    """Returns grid as a Grid, converting list of lists grids"""
+    if isinstance(grid, Grid):
+        return grid
+    return Grid.from_rows(grid)
 
 def node(pos: tuple[int, int], g: int, h: int, parent: dict | None = None) -> dict:
     return {
@@ -13,7 +123,8 @@ def node(pos: tuple[int, int], g: int, h: int, parent: dict | None = None) -> di
     
 
 def heuristic(start, goal):
-    return abs(goal[0] - start[0]) + abs(goal[1] - start[1])
+    """Octile distance, admissible for 8-connected moves (Manhattan overestimates diagonals)"""
+    return octile(goal[0] - start[0], goal[1] - start[1])
 
 def reconstruct_path(current):
     path = []
@@ -41,107 +152,1537 @@ def get_neighbors_pos(current, grid) -> list:
         and grid[ny][nx] == 0
     ]
 
-def astar(start: tuple[int, int], goal: tuple[int, int], grid):
-    open_list: list[tuple] = []
-    open_dict = {}
-    closed_list = set()
+def octile(dx: int, dy: int) -> float:
+    """Cost of the shortest 8-connected move sequence over dx, dy (straight steps 1, diagonal steps sqrt 2)"""
+    dx, dy = abs(dx), abs(dy)
+    return (SQRT2 - 1) * min(dx, dy) + max(dx, dy)
 
-    start_node = node(start, 0, heuristic(start, goal))
-    
-    open_list.append((start_node["f"], start))
-    open_dict[start_node["pos"]] = start_node
+def path_cost(path: list[tuple[int, int]]) -> float:
+    """Sum of the step costs along a path"""
+    return sum(octile(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:]))
+
+class ComponentIndex:
+    """
+    Labels the 8-connected regions of free cells (same moves as get_neighbors_pos), so whether a path
+    exists at all is answered in O(1) instead of by flooding the whole region with a failing search.
+    Stays valid when cells change: opening a cell merges the labels around it with union-find,
+    closing one only relabels the piece that got cut off (if any).
+    """
+    def __init__(self, grid):
+        self.grid = as_grid(grid)
+        cells = self.grid.cells
+        offsets = self.grid.offsets
+        self.labels = array("i", bytes(4 * len(cells)))   # 0 for obstacles
+        self.parents = [0]                                 # union-find over the labels, parents[label]
+
+        labels = self.labels
+        for index in range(len(cells)):
+            if cells[index] or labels[index]:
+                continue
+
+            label = self._new_label()
+            labels[index] = label
+            stack = [index]
+            while stack:
+                current = stack.pop()
+                for offset in offsets:
+                    neighbor = current + offset
+                    if not cells[neighbor] and not labels[neighbor]:
+                        labels[neighbor] = label
+                        stack.append(neighbor)
+
+    def _new_label(self) -> int:
+        self.parents.append(len(self.parents))
+        return len(self.parents) - 1
+
+    def find(self, label: int) -> int:
+        parents = self.parents
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    def component(self, pos: tuple[int, int]) -> int:
+        """The region id of a cell, 0 for obstacles"""
+        if not self.grid.in_bounds(pos):
+            return 0
+        label = self.labels[self.grid.index(pos)]
+        return self.find(label) if label else 0
+
+    def connected(self, a: tuple[int, int], b: tuple[int, int]) -> bool:
+        """True if both cells are free and a path between them exists"""
+        component = self.component(a)
+        return component != 0 and component == self.component(b)
+
+    def set_cell(self, pos: tuple[int, int], value: int):
+        """Changes a cell of the grid and keeps the labels valid"""
+        if not self.grid.in_bounds(pos):
+            raise IndexError(f"{pos} is outside of the grid")
+        if bool(self.grid[pos]) == bool(value):
+            return
+        if value:
+            self._close(self.grid.index(pos))
+        else:
+            self._open(self.grid.index(pos))
+
+    def _open(self, index: int):
+        cells, labels = self.grid.cells, self.labels
+        cells[index] = 0
+        roots = {self.find(labels[index + o]) for o in self.grid.offsets if not cells[index + o]}
+
+        if not roots:
+            labels[index] = self._new_label()
+            return
+
+        root = roots.pop()
+        for other in roots:
+            self.parents[other] = root
+        labels[index] = root
+
+    def _close(self, index: int):
+        cells, labels = self.grid.cells, self.labels
+        offsets = self.grid.offsets
+        cells[index] = 1
+        labels[index] = 0
+
+        # free ring cells that still touch each other (neighbors in the ring, or orthogonal
+        # neighbors of the closed cell that meet diagonally) stay connected, group them first
+        ring = [index + o for o in (offsets[0], offsets[1], offsets[2], offsets[4], offsets[7], offsets[6], offsets[5], offsets[3])]
+        free = [not cells[i] for i in ring]
+        groups = []
+        for i in range(8):
+            if not free[i]:
+                continue
+            if groups and free[i - 1] and i > 0:
+                groups[-1].append(ring[i])
+            else:
+                groups.append([ring[i]])
+        if len(groups) > 1 and free[0] and free[7]:
+            groups[0].extend(groups.pop())
+
+        # N, E, S, W are at ring positions 1, 3, 5, 7 and touch diagonally around the closed cell
+        merged = True
+        while merged and len(groups) > 1:
+            merged = False
+            for a, b in ((1, 3), (3, 5), (5, 7), (7, 1)):
+                if free[a] and free[b]:
+                    ga = next(g for g in groups if ring[a] in g)
+                    gb = next(g for g in groups if ring[b] in g)
+                    if ga is not gb:
+                        ga.extend(gb)
+                        groups.remove(gb)
+                        merged = True
+
+        if len(groups) < 2:
+            return
+
+        self._split(groups)
+
+    def _split(self, groups: list[list[int]]):
+        """
+        Floods out from every group at the same pace. Groups that meet are merged, a group that runs
+        out of cells before meeting the others got cut off and gets a new label. Stops as soon as only
+        one group is left, so the work is bounded by the size of the smaller pieces.
+        """
+        cells, labels = self.grid.cells, self.labels
+        offsets = self.grid.offsets
+        owner = {}
+        group_of = list(range(len(groups)))
+        frontiers = [deque(g) for g in groups]
+        visited = [list(g) for g in groups]
+
+        def root(g):
+            while group_of[g] != g:
+                g = group_of[g]
+            return g
+
+        for g, seeds in enumerate(groups):
+            for cell in seeds:
+                owner[cell] = g
+
+        active = set(range(len(groups)))
+
+        while len(active) > 1:
+            for g in list(active):
+                if g not in active:
+                    continue
+
+                frontier = frontiers[g]
+                if not frontier:
+                    # cut off from everything else: this piece becomes its own region
+                    label = self._new_label()
+                    for cell in visited[g]:
+                        labels[cell] = label
+                    active.discard(g)
+                    if len(active) <= 1:
+                        break
+                    continue
+
+                current = frontier.popleft()
+                for offset in offsets:
+                    neighbor = current + offset
+                    if cells[neighbor]:
+                        continue
+                    other = owner.get(neighbor)
+                    if other is None:
+                        owner[neighbor] = g
+                        visited[g].append(neighbor)
+                        frontier.append(neighbor)
+                    elif root(other) != g:
+                        # met another group: still one region, continue as one
+                        h = root(other)
+                        group_of[h] = g
+                        frontier.extend(frontiers[h])
+                        visited[g].extend(visited[h])
+                        frontiers[h].clear()
+                        active.discard(h)
+                        if len(active) <= 1:
+                            break
+
+class PathPlanner:
+    """
+    Answers many path queries on the same grid. The search buffers are allocated once;
+    instead of clearing them between queries every entry is stamped with the number of
+    the query that wrote it, so anything with an older stamp counts as empty.
+    """
+    def __init__(self, grid, algo: str = "astar", components: "ComponentIndex | None" = None, index: bool = True):
+        """components is reused if given, otherwise one is built unless index is False"""
+        if algo not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm {algo}, use one of {ALGORITHMS}")
+
+        self.grid = as_grid(grid)
+        self.algo = algo
+        self.components = components if components is not None or not index else ComponentIndex(self.grid)
+        # hpa keeps its own abstract graph, the buffers below are only used by plain A*
+        self.hierarchy = HierarchicalPlanner(self.grid, components=self.components) if algo == "hpa" else None
+        size = len(self.grid.cells)
+        stride = self.grid.stride
+
+        self.neighbors = [(offset, 1.0 if abs(offset) in (1, stride) else SQRT2) for offset in self.grid.offsets]
+        self.g_score = array("d", bytes(8 * size))
+        self.parent = array("i", bytes(4 * size))
+        self.seen = array("I", bytes(4 * size))     # query number that last set g_score / parent
+        self.closed = array("I", bytes(4 * size))   # query number that last expanded the cell
+        self.generation = 0
+
+    def _next_generation(self) -> int:
+        self.generation += 1
+        if self.generation >= 0xFFFFFFFF:
+            # the stamps would wrap around, start over with clean buffers
+            size = len(self.seen)
+            self.seen = array("I", bytes(4 * size))
+            self.closed = array("I", bytes(4 * size))
+            self.generation = 1
+        return self.generation
+
+    def plan(self, start: tuple[int, int], goal: tuple[int, int], stats: dict | None = None) -> list[tuple[int, int]]:
+        """Same as astar(start, goal, grid), without allocating anything per query"""
+        if self.hierarchy is not None:
+            return self.hierarchy.plan(start, goal, stats)
+
+        grid = self.grid
+        expanded = pushed = 0
+        if stats is not None:
+            stats.update(expanded=0, pushed=0)
+
+        if not grid.in_bounds(start) or not grid.in_bounds(goal):
+            return []
+
+        # different regions: no search could ever succeed
+        if self.components is not None and not self.components.connected(start, goal):
+            return []
+
+        if self.algo == "jps":
+            return jps(start, goal, grid, stats)
+
+        cells = grid.cells
+        stride = grid.stride
+        neighbors = self.neighbors
+        g_score, parent, seen, closed = self.g_score, self.parent, self.seen, self.closed
+        generation = self._next_generation()
+
+        start_i = grid.index(start)
+        goal_i = grid.index(goal)
+        goal_x, goal_y = goal_i % stride, goal_i // stride
+        path = []
+
+        if cells[start_i] or cells[goal_i]:
+            return path
+
+        def h(index):
+            dx = abs(goal_x - index % stride)
+            dy = abs(goal_y - index // stride)
+            return dx + dy + (SQRT2 - 2) * (dx if dx < dy else dy)
+
+        g_score[start_i] = 0.0
+        parent[start_i] = -1
+        seen[start_i] = generation
+        # (f, -g, index): on equal f the node closer to the goal (higher g) comes first
+        open_list: list[tuple] = [(h(start_i), -0.0, start_i)]
+
+        while open_list:
+            _, _, current = heappop(open_list)
+
+            # entries are never updated in place, older (worse) copies of a node are just skipped
+            if closed[current] == generation:
+                continue
+
+            if current == goal_i:
+                while current != -1:
+                    path.append(grid.pos(current))
+                    current = parent[current]
+                path.reverse()
+                break
+
+            closed[current] = generation
+            expanded += 1
+            current_g = g_score[current]
+
+            for offset, step in neighbors:
+                neighbor = current + offset
+
+                if cells[neighbor] or closed[neighbor] == generation:
+                    continue
+
+                tentative_g = current_g + step
+
+                if seen[neighbor] != generation or tentative_g < g_score[neighbor]:
+                    seen[neighbor] = generation
+                    g_score[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    heappush(open_list, (tentative_g + h(neighbor), -tentative_g, neighbor))
+                    pushed += 1
+
+        if stats is not None:
+            stats["expanded"] = expanded
+            stats["pushed"] = pushed
+
+        return path
+
+    def set_cell(self, pos: tuple[int, int], value: int):
+        """Changes a cell and keeps the component index (and the hpa graph) up to date"""
+        if self.hierarchy is not None:
+            self.hierarchy.set_cell(pos, value)
+        elif self.components is not None:
+            self.components.set_cell(pos, value)
+        else:
+            self.grid[pos] = value
+
+    def plan_many(self, pairs: list[tuple[tuple[int, int], tuple[int, int]]], processes: int | None = None) -> list[list[tuple[int, int]]]:
+        """
+        Plans a path for every (start, goal) pair and returns them in the same order.
+        The queries are spread over a process pool (processes=None uses every core, 1 stays in this process).
+        """
+        pairs = list(pairs)
+
+        if processes == 1 or len(pairs) < 2:
+            return [self.plan(start, goal) for start, goal in pairs]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = processes or os.cpu_count() or 1
+        # big chunks so the workers aren't waiting on the pipe for every single query
+        chunksize = max(1, len(pairs) // (workers * 4))
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker_planner,
+            initargs=(self.grid.width, self.grid.height, bytes(self.grid.cells), self.algo)
+        ) as executor:
+            return list(executor.map(_worker_plan, pairs, chunksize=chunksize))
+
+# Each worker process builds its own planner once and reuses it for every query it gets
+_worker_planner: PathPlanner | None = None
+
+def _init_worker_planner(width: int, height: int, cells: bytes, algo: str):
+    global _worker_planner
+    # every worker builds its own component index, sending the labels over would cost about as much
+    _worker_planner = PathPlanner(Grid(width, height, bytearray(cells)), algo)
+
+def _worker_plan(pair):
+    return _worker_planner.plan(*pair)
+
+def astar(start: tuple[int, int], goal: tuple[int, int], grid, algo: str = "astar", stats: dict | None = None,
+          components: ComponentIndex | None = None):
+    """
+    Finds a shortest path from start to goal (straight steps cost 1, diagonal steps sqrt 2).
+    grid is a Grid or a list of lists (grid[y][x], 0 free, 1 obstacle).
+    algo is "astar", "jps" (Jump Point Search, only for uniform cost grids like these)
+    or "hpa" (hierarchical, near optimal, see HierarchicalPlanner).
+    If a stats dict is passed, the number of expanded and pushed nodes is stored in it.
+    If a ComponentIndex of the grid is passed, unreachable goals are rejected without searching.
+    Returns the path as a list of (x, y) positions or [] if there is none.
+    For many queries on the same grid use a PathPlanner instead.
+    """
+    if algo == "hpa":
+        return PathPlanner(grid, algo, components, index=False).plan(start, goal, stats)
+    if algo not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm {algo}, use one of {ALGORITHMS}")
+
+    grid = as_grid(grid)
+    expanded = pushed = 0
+    if stats is not None:
+        stats.update(expanded=0, pushed=0)
+
+    if not grid.in_bounds(start) or not grid.in_bounds(goal):
+        return []
+    # a one-off index would cost as much as the search, so only use one if it was given
+    if components is not None and not components.connected(start, goal):
+        return []
+    if algo == "jps":
+        return jps(start, goal, grid, stats)
+
+    cells = grid.cells
+    stride = grid.stride
+    neighbors = [(offset, 1.0 if abs(offset) in (1, stride) else SQRT2) for offset in grid.offsets]
+
+    start_i = grid.index(start)
+    goal_i = grid.index(goal)
+    goal_x, goal_y = goal_i % stride, goal_i // stride
+    path = []
+
+    if cells[start_i] or cells[goal_i]:
+        return path
+
+    def h(index):
+        dx = abs(goal_x - index % stride)
+        dy = abs(goal_y - index // stride)
+        return dx + dy + (SQRT2 - 2) * (dx if dx < dy else dy)
+
+    # dicts instead of PathPlanner's per cell buffers, a single query only pays for the cells it touches
+    inf = float("inf")
+    g_score = {start_i: 0.0}
+    parent = {start_i: -1}
+    closed = set()
+    # (f, -g, index): on equal f the node closer to the goal (higher g) comes first
+    open_list: list[tuple] = [(h(start_i), -0.0, start_i)]
+
+    while open_list:
+        _, _, current = heappop(open_list)
+
+        # entries are never updated in place, older (worse) copies of a node are just skipped
+        if current in closed:
+            continue
+
+        if current == goal_i:
+            while current != -1:
+                path.append(grid.pos(current))
+                current = parent[current]
+            path.reverse()
+            break
+
+        closed.add(current)
+        expanded += 1
+        current_g = g_score[current]
+
+        for offset, step in neighbors:
+            neighbor = current + offset
+
+            if cells[neighbor] or neighbor in closed:
+                continue
+
+            tentative_g = current_g + step
+
+            if tentative_g < g_score.get(neighbor, inf):
+                g_score[neighbor] = tentative_g
+                parent[neighbor] = current
+                heappush(open_list, (tentative_g + h(neighbor), -tentative_g, neighbor))
+                pushed += 1
+
+    if stats is not None:
+        stats["expanded"] = expanded
+        stats["pushed"] = pushed
+
+    return path
+
+
+def jps(start: tuple[int, int], goal: tuple[int, int], grid, stats: dict | None = None):
+    """
+    Jump Point Search: A* that skips over the cells of straight and diagonal runs that
+    can't branch, and only puts the jump points where the path may turn into the open list.
+    Gives paths with the same (optimal, octile) cost as a full search with far fewer expansions.
+    """
+    grid = as_grid(grid)
+    if stats is not None:
+        stats.update(expanded=0, pushed=0)
+
+    if not grid.in_bounds(start) or not grid.in_bounds(goal):
+        return []
+
+    cells = grid.cells
+    stride = grid.stride
+    start_i = grid.index(start)
+    goal_i = grid.index(goal)
+
+    if cells[start_i] or cells[goal_i]:
+        return []
+
+    goal_x, goal_y = goal_i % stride, goal_i // stride
+
+    def jump_straight(index, dx, dy):
+        """Walks in a straight line until it hits a wall, the goal or a cell with a forced neighbor"""
+        step = dy * stride + dx
+        # the cells left and right of the direction of travel
+        side = stride if dy == 0 else 1
+
+        while True:
+            index += step
+            if cells[index]:
+                return -1
+            if index == goal_i:
+                return index
+            if (cells[index + side] and not cells[index + side + step]) or \
+               (cells[index - side] and not cells[index - side + step]):
+                return index
+
+    def jump_diagonal(index, dx, dy):
+        while True:
+            index += dy * stride + dx
+            if cells[index]:
+                return -1
+            if index == goal_i:
+                return index
+            if (cells[index - dx] and not cells[index - dx + dy * stride]) or \
+               (cells[index - dy * stride] and not cells[index + dx - dy * stride]):
+                return index
+            if jump_straight(index, dx, 0) != -1 or jump_straight(index, 0, dy) != -1:
+                return index
+
+    def directions(index, parent):
+        """The directions worth exploring from a jump point, given where the search came from"""
+        if parent == -1:
+            return [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+        px, py = parent % stride, parent // stride
+        x, y = index % stride, index // stride
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+
+        if dx and dy:
+            result = [(dx, dy), (dx, 0), (0, dy)]
+            if cells[index - dx]:
+                result.append((-dx, dy))
+            if cells[index - dy * stride]:
+                result.append((dx, -dy))
+        elif dx:
+            result = [(dx, 0)]
+            if cells[index + stride]:
+                result.append((dx, 1))
+            if cells[index - stride]:
+                result.append((dx, -1))
+        else:
+            result = [(0, dy)]
+            if cells[index + 1]:
+                result.append((1, dy))
+            if cells[index - 1]:
+                result.append((-1, dy))
+
+        return result
+
+    def h(index):
+        return octile(goal_x - index % stride, goal_y - index // stride)
+
+    g_score = {start_i: 0.0}
+    parent = {start_i: -1}
+    closed = set()
+    open_list = [(h(start_i), -0.0, start_i)]
+    expanded = pushed = 0
+    path = []
+
+    while open_list:
+        _, _, current = heappop(open_list)
+
+        if current in closed:
+            continue
+
+        if current == goal_i:
+            jump_points = []
+            while current != -1:
+                jump_points.append(grid.pos(current))
+                current = parent[current]
+            path = expand_jump_points(jump_points[::-1])
+            break
+
+        closed.add(current)
+        expanded += 1
+
+        for dx, dy in directions(current, parent[current]):
+            # diagonal moves between jump points can't be blocked by the cells they pass (same rule as get_neighbors_pos)
+            if dx and dy:
+                successor = jump_diagonal(current, dx, dy)
+            else:
+                successor = jump_straight(current, dx, dy)
+
+            if successor == -1 or successor in closed:
+                continue
+
+            distance = octile(successor % stride - current % stride, successor // stride - current // stride)
+            tentative_g = g_score[current] + distance
+
+            if tentative_g < g_score.get(successor, float("inf")):
+                g_score[successor] = tentative_g
+                parent[successor] = current
+                heappush(open_list, (tentative_g + h(successor), -tentative_g, successor))
+                pushed += 1
+
+    if stats is not None:
+        stats["expanded"] = expanded
+        stats["pushed"] = pushed
+
+    return path
+
+def expand_jump_points(jump_points: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Fills in the cells between jump points (always on a straight or diagonal line)"""
+    path = jump_points[:1]
+
+    for (x1, y1) in jump_points[1:]:
+        x, y = path[-1]
+        dx = (x1 > x) - (x1 < x)
+        dy = (y1 > y) - (y1 < y)
+        while (x, y) != (x1, y1):
+            x, y = x + dx, y + dy
+            path.append((x, y))
+
+    return path
+
+def check_jps(runs: int = 100, seed: int | None = None) -> list[tuple]:
+    """
+    Regression check for jps: compares its path costs with plain A* on random grids.
+    Returns the failing cases as (grid, start, goal, expected cost, jps cost), [] means everything matched.
+    """
+    rng = random.Random(seed)
+    failures = []
+
+    for _ in range(runs):
+        width, height = rng.randint(2, 40), rng.randint(2, 40)
+        chance = rng.random() * 0.45
+        start = (rng.randint(0, width - 1), rng.randint(0, height - 1))
+        goal = (rng.randint(0, width - 1), rng.randint(0, height - 1))
+
+        grid = Grid(width, height)
+        for y in range(height):
+            for x in range(width):
+                grid[x, y] = rng.random() < chance
+        grid[start] = 0
+        grid[goal] = 0
 
-    while open_list != []:
-        _, current_pos = heappop(open_list)
-        current_node = open_dict[current_pos]
+        reference = astar(start, goal, grid)
+        expected = path_cost(reference) if reference else None
+        path = jps(start, goal, grid)
+        cost = path_cost(path) if path else None
 
-        if current_pos == goal:
-            return reconstruct_path(current_node)
-        
-        closed_list.add(current_pos)
+        valid = all(grid[b] == 0 and max(abs(b[0] - a[0]), abs(b[1] - a[1])) == 1 for a, b in zip(path, path[1:]))
 
-        for neighbor_pos in get_neighbors_pos(current_pos, grid):
-            if neighbor_pos in closed_list:
+        if (expected is None) != (cost is None) or not valid or \
+           (cost is not None and abs(cost - expected) > 1e-9):
+            failures.append((grid, start, goal, expected, cost))
+
+    return failures
+
+class HierarchicalPlanner:
+    """
+    HPA*: cuts the grid into square clusters and precomputes a small abstract graph out of the
+    cells where a path can cross from one cluster into the next (entrances) and the distances
+    between the entrances of each cluster. A query only searches that graph, and the route is
+    only turned into cells for the segments the caller actually walks (see iter_path).
+    The paths are close to, but not always exactly, the shortest ones.
+
+    Crossings over a border are grouped by the pieces (8-connected regions inside a cluster) they
+    join on both sides. Any crossing of a group can stand in for the others, so a group only gets
+    one entrance, or one at each end if it's long. Diagonal squeezes join the group of their pieces.
+    """
+    # groups of crossings that span at least this many cells along the border get an entrance at both ends
+    LONG_ENTRANCE = 6
+
+    def __init__(self, grid, cluster_size: int = 16, components: ComponentIndex | None = None):
+        if cluster_size < 2:
+            raise ValueError("cluster_size has to be at least 2")
+
+        self.grid = as_grid(grid)
+        self.components = components if components is not None else ComponentIndex(self.grid)
+        self.cluster_size = cluster_size
+        self.columns = -(-self.grid.width // cluster_size)
+        self.rows = -(-self.grid.height // cluster_size)
+
+        self.inter = {}          # entrance cell -> {entrance cell of the neighboring cluster: step cost}
+        self.border_pairs = {}   # (cluster, cluster) -> [(cell, cell)] crossings over that border
+        self.nodes = {}          # cluster -> entrance cells inside it
+        self.intra = {}          # cluster -> {entrance cell: {entrance cell: distance inside the cluster}}
+        self.adjacent = {}       # entrance cell -> every edge of the abstract graph leaving it
+        self._segments = {}      # refined (a, b) segments, dropped whenever the grid changes
+        self._local = {}         # cluster -> (cells, pieces) while building, see _cluster_info
+
+        # row by row, so only the copies of two rows of clusters are kept at a time
+        for cy in range(self.rows):
+            for key in self._row_borders(cy):
+                self._build_border(key)
+            for cx in range(self.columns):
+                self._build_cluster((cx, cy))
+            for cx in range(self.columns):
+                self._local.pop((cx, cy), None)
+
+    def cluster_of(self, pos: tuple[int, int]) -> tuple[int, int]:
+        return pos[0] // self.cluster_size, pos[1] // self.cluster_size
+
+    def _rect(self, cluster: tuple[int, int]) -> tuple[int, int, int, int]:
+        cs = self.cluster_size
+        x0, y0 = cluster[0] * cs, cluster[1] * cs
+        return x0, y0, min(x0 + cs, self.grid.width), min(y0 + cs, self.grid.height)
+
+    def _row_borders(self, cy: int):
+        """The borders between the clusters of row cy and their right and lower neighbors"""
+        for cx in range(self.columns):
+            for other in ((cx + 1, cy), (cx, cy + 1), (cx + 1, cy + 1)):
+                if other[0] < self.columns and other[1] < self.rows:
+                    yield ((cx, cy), other)
+            # the other diagonal through the same corner
+            if cx + 1 < self.columns and cy + 1 < self.rows:
+                yield ((cx + 1, cy), (cx, cy + 1))
+
+    def _border_cells(self, key) -> tuple[list, list]:
+        """The cells of both clusters that face each other across a border, a_cells[i] next to b_cells[i]"""
+        (ax, ay), (bx, by) = key
+        cs = self.cluster_size
+
+        if by == ay:
+            x = bx * cs
+            _, y0, _, y1 = self._rect(key[0])
+            return [(x - 1, y) for y in range(y0, y1)], [(x, y) for y in range(y0, y1)]
+
+        if bx == ax:
+            y = by * cs
+            x0, _, x1, _ = self._rect(key[0])
+            return [(x, y - 1) for x in range(x0, x1)], [(x, y) for x in range(x0, x1)]
+
+        # the two clusters only touch in a corner
+        corner_x, corner_y = max(ax, bx) * cs, by * cs
+        return [(corner_x - 1 if ax < bx else corner_x, corner_y - 1)], [(corner_x if ax < bx else corner_x - 1, corner_y)]
+
+    def _build_border(self, key) -> bool:
+        """Picks the entrances over one border, returns whether they changed"""
+        grid = self.grid
+        inter = self.inter
+
+        old = self.border_pairs.pop(key, [])
+        for a, b in old:
+            inter[a].pop(b, None)
+            inter[b].pop(a, None)
+
+        a_cells, b_cells = self._border_cells(key)
+        pairs = []
+
+        (ax, ay), (bx, by) = key
+        if ax != bx and ay != by:
+            # Squeezing past the corner is only needed when both cells beside it are obstacles,
+            # otherwise a path can step around it through the other two clusters
+            a, b = a_cells[0], b_cells[0]
+            if not grid[a] and not grid[b] and grid[(b[0], a[1])] and grid[(a[0], b[1])]:
+                pairs.append((a, b))
+        else:
+            a_info, b_info = self._cluster_info(key[0]), self._cluster_info(key[1])
+            a_pieces = [a_info[1][self._local_index(a_info[0], pos)] for pos in a_cells]
+            b_pieces = [b_info[1][self._local_index(b_info[0], pos)] for pos in b_cells]
+            last = len(a_cells) - 1
+
+            groups = {}  # (piece on the a side, piece on the b side) -> crossings (i, j) along the border
+            for i, a_piece in enumerate(a_pieces):
+                if not a_piece:
+                    continue
+                # straight across and the two diagonals (get_neighbors_pos allows squeezing past corners)
+                for j in (i, i - 1, i + 1):
+                    if 0 <= j <= last and b_pieces[j]:
+                        groups.setdefault((a_piece, b_pieces[j]), []).append((i, j))
+
+            for crossings in groups.values():
+                straight = [(i, j) for i, j in crossings if i == j] or crossings
+                if crossings[-1][0] - crossings[0][0] + 1 >= self.LONG_ENTRANCE:
+                    picks = sorted({straight[0], straight[-1]})
+                else:
+                    picks = [straight[len(straight) // 2]]
+                pairs.extend((a_cells[i], b_cells[j]) for i, j in picks)
+
+        for a, b in pairs:
+            cost = octile(b[0] - a[0], b[1] - a[1])
+            inter.setdefault(a, {})[b] = cost
+            inter.setdefault(b, {})[a] = cost
+
+        self.border_pairs[key] = pairs
+        return pairs != old
+
+    def _cluster_cells(self, cluster: tuple[int, int]) -> tuple[bytearray, int, int, int]:
+        """Copies a cluster into its own small padded grid, so searches in it need no bounds checks"""
+        grid = self.grid
+        x0, y0, x1, y1 = self._rect(cluster)
+        width = x1 - x0
+        stride = width + 2
+        local = bytearray(b"\x01") * (stride * (y1 - y0 + 2))
+
+        for y in range(y0, y1):
+            row = grid.index((x0, y))
+            local_row = (y - y0 + 1) * stride + 1
+            local[local_row:local_row + width] = grid.cells[row:row + width]
+
+        return local, stride, x0, y0
+
+    @staticmethod
+    def _local_index(cells: tuple, pos: tuple[int, int]) -> int:
+        _, stride, x0, y0 = cells
+        return (pos[1] - y0 + 1) * stride + pos[0] - x0 + 1
+
+    @staticmethod
+    def _pieces(cells: tuple) -> list[int]:
+        """Labels the 8-connected regions of a cluster copy 1, 2, ... by local index, obstacles are 0"""
+        local, stride = cells[0], cells[1]
+        offsets = (-stride - 1, -stride, -stride + 1, -1, 1, stride - 1, stride, stride + 1)
+        pieces = [0] * len(local)
+        piece = 0
+
+        for seed in range(len(local)):
+            if local[seed] or pieces[seed]:
+                continue
+            piece += 1
+            pieces[seed] = piece
+            stack = [seed]
+            while stack:
+                current = stack.pop()
+                for offset in offsets:
+                    neighbor = current + offset
+                    if not local[neighbor] and not pieces[neighbor]:
+                        pieces[neighbor] = piece
+                        stack.append(neighbor)
+
+        return pieces
+
+    def _cluster_info(self, cluster: tuple[int, int]) -> tuple[tuple, list[int]]:
+        """The copy of a cluster and its pieces, kept in _local until the build is done"""
+        info = self._local.get(cluster)
+        if info is None:
+            cells = self._cluster_cells(cluster)
+            info = self._local[cluster] = (cells, self._pieces(cells))
+        return info
+
+    @staticmethod
+    def _cluster_search(source: int, targets, cells: tuple, goal: int | None = None) -> tuple[list[float], list[int]]:
+        """
+        Dijkstra over a cluster copy (from _cluster_cells) from the local index source, stops once every
+        target is settled. With a goal it's an A* towards that one index instead.
+        Returns the distances and parents, both lists by local index (inf and -1 for cells it didn't reach).
+        """
+        local, stride = cells[0], cells[1]
+        size = len(local)
+        steps = [(o, 1.0 if abs(o) in (1, stride) else SQRT2) for o in (-stride - 1, -stride, -stride + 1, -1, 1, stride - 1, stride, stride + 1)]
+        inf = float("inf")
+        distances = [inf] * size
+        parents = [-1] * size
+
+        if goal is not None:
+            targets = (goal,)
+            goal_x, goal_y = goal % stride, goal // stride
+        wanted = bytearray(size)
+        for target in targets:
+            wanted[target] = 1
+        wanted[source] = 0
+        remaining = wanted.count(1)
+
+        distances[source] = 0.0
+        open_list = [(0.0, 0.0, source)]
+        while open_list and remaining:
+            _, distance, current = heappop(open_list)
+            if distance > distances[current]:
+                continue
+            if wanted[current]:
+                wanted[current] = 0
+                remaining -= 1
+
+            for offset, step in steps:
+                neighbor = current + offset
+                if local[neighbor]:
+                    continue
+                tentative = distance + step
+                if tentative < distances[neighbor]:
+                    distances[neighbor] = tentative
+                    parents[neighbor] = current
+                    if goal is None:
+                        heappush(open_list, (tentative, tentative, neighbor))
+                    else:
+                        dx, dy = abs(goal_x - neighbor % stride), abs(goal_y - neighbor // stride)
+                        heappush(open_list, (tentative + dx + dy + (SQRT2 - 2) * (dx if dx < dy else dy), tentative, neighbor))
+
+        return distances, parents
+
+    def _cluster_distances(self, source: tuple[int, int], targets, cells: tuple) -> dict:
+        """Distances inside the cluster from source to the reachable targets"""
+        local = [self._local_index(cells, target) for target in targets]
+        distances, _ = self._cluster_search(self._local_index(cells, source), local, cells)
+        return {target: distances[i] for target, i in zip(targets, local) if distances[i] != float("inf")}
+
+    def _cluster_borders(self, cluster):
+        cx, cy = cluster
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                other = (cx + ox, cy + oy)
+                if (ox or oy) and 0 <= other[0] < self.columns and 0 <= other[1] < self.rows:
+                    yield self._border_key(cluster, other)
+
+    def _build_cluster(self, cluster):
+        nodes = set()
+        for key in self._cluster_borders(cluster):
+            for a, b in self.border_pairs.get(key, []):
+                nodes.add(a if self.cluster_of(a) == cluster else b)
+        nodes = sorted(nodes)
+
+        cells, pieces = self._cluster_info(cluster)
+        local = [self._local_index(cells, node) for node in nodes]
+        edges = {node: {} for node in nodes}
+        for i, node in enumerate(nodes):
+            # distances are symmetric, so each search only needs the later nodes in the same piece
+            targets = [j for j in range(i + 1, len(nodes)) if pieces[local[j]] == pieces[local[i]]]
+            if not targets:
+                continue
+            distances, _ = self._cluster_search(local[i], [local[j] for j in targets], cells)
+            for j in targets:
+                edges[node][nodes[j]] = edges[nodes[j]][node] = distances[local[j]]
+
+        for node in self.nodes.get(cluster, []):
+            self.adjacent.pop(node, None)
+        for node in nodes:
+            # intra and inter edges merged, so the abstract search only looks at one dict per node
+            self.adjacent[node] = {**edges[node], **self.inter.get(node, {})}
+
+        self.nodes[cluster] = nodes
+        self.intra[cluster] = edges
+
+    def set_cell(self, pos: tuple[int, int], value: int):
+        """Changes one cell and rebuilds only the borders and clusters that depend on it"""
+        self.update([(pos, value)])
+
+    def update(self, changes: list[tuple[tuple[int, int], int]]):
+        """Changes several cells ((x, y), value) at once and rebuilds only the affected borders and clusters"""
+        clusters = set()
+        for pos, value in changes:
+            self.components.set_cell(pos, value)
+            clusters.add(self.cluster_of(pos))
+
+        # The pieces of a changed cluster can split or merge, so all its borders are picked again,
+        # and the corners next to it (a corner squeeze depends on the two cells beside it)
+        borders = set()
+        for cx, cy in clusters:
+            borders.update(self._cluster_borders((cx, cy)))
+            for ox, oy in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+                a, b = (cx + ox, cy), (cx, cy + oy)
+                if 0 <= a[0] < self.columns and 0 <= b[1] < self.rows:
+                    borders.add(self._border_key(a, b))
+
+        rebuild = set(clusters)
+        for key in borders:
+            if self._build_border(key):
+                rebuild.update(key)
+        for cluster in rebuild:
+            self._build_cluster(cluster)
+
+        self._local.clear()
+        self._segments.clear()
+
+    def _border_key(self, a, b):
+        """Borders are stored with the same orientation _row_borders creates them with"""
+        if a[1] == b[1] or a[0] == b[0]:
+            return (a, b) if a < b else (b, a)
+        # diagonal neighbors: the upper cluster comes first
+        return (a, b) if a[1] < b[1] else (b, a)
+
+    def plan_abstract(self, start: tuple[int, int], goal: tuple[int, int], stats: dict | None = None) -> list[tuple[int, int]]:
+        """Searches the abstract graph, returns the waypoints (start, entrances..., goal) or [] if there is no path"""
+        grid = self.grid
+        if stats is not None:
+            stats.update(expanded=0, pushed=0)
+
+        if not self.components.connected(start, goal):
+            return []
+        if start == goal:
+            return [start]
+
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+
+        # connect start and goal to the entrances of their own cluster for this query only
+        targets = list(self.nodes[start_cluster])
+        if goal_cluster == start_cluster:
+            targets.append(goal)
+        start_links = self._cluster_distances(start, targets, self._cluster_cells(start_cluster))
+        goal_links = self._cluster_distances(goal, self.nodes[goal_cluster], self._cluster_cells(goal_cluster))
+        adjacent = self.adjacent
+
+        def neighbors(node):
+            edges = adjacent.get(node, {})
+            if node == start:
+                edges = {**edges, **start_links}
+            if node in goal_links:
+                edges = {**edges, goal: goal_links[node]}
+            return edges.items()
+
+        g_score = {start: 0.0}
+        parent = {start: None}
+        closed = set()
+        open_list = [(heuristic(start, goal), -0.0, start)]
+        expanded = pushed = 0
+        waypoints = []
+
+        while open_list:
+            _, _, current = heappop(open_list)
+            if current in closed:
+                continue
+
+            if current == goal:
+                while current is not None:
+                    waypoints.append(current)
+                    current = parent[current]
+                waypoints.reverse()
+                break
+
+            closed.add(current)
+            expanded += 1
+
+            for neighbor, cost in neighbors(current):
+                if neighbor in closed:
+                    continue
+                tentative = g_score[current] + cost
+                if tentative < g_score.get(neighbor, float("inf")):
+                    g_score[neighbor] = tentative
+                    parent[neighbor] = current
+                    heappush(open_list, (tentative + heuristic(neighbor, goal), -tentative, neighbor))
+                    pushed += 1
+
+        if stats is not None:
+            stats["expanded"] = expanded
+            stats["pushed"] = pushed
+
+        return waypoints
+
+    def refine(self, a: tuple[int, int], b: tuple[int, int]) -> list[tuple[int, int]]:
+        """The cells from a (exclusive) to b (inclusive) between two consecutive waypoints"""
+        if (a, b) in self._segments:
+            return self._segments[(a, b)]
+
+        cluster = self.cluster_of(a)
+        if cluster != self.cluster_of(b):
+            # crossing a border is always a single step
+            segment = [b]
+        else:
+            cells = self._cluster_cells(cluster)
+            _, parents = self._cluster_search(self._local_index(cells, a), (), cells, goal=self._local_index(cells, b))
+            _, stride, x0, y0 = cells
+            segment = []
+            current = self._local_index(cells, b)
+            while parents[current] != -1:
+                y, x = divmod(current, stride)
+                segment.append((x + x0 - 1, y + y0 - 1))
+                current = parents[current]
+            segment.reverse()
+
+        self._segments[(a, b)] = segment
+        return segment
+
+    def iter_path(self, start: tuple[int, int], goal: tuple[int, int]):
+        """Yields the cells of the path one by one, each segment is only refined once the walk reaches it"""
+        waypoints = self.plan_abstract(start, goal)
+        if not waypoints:
+            return
+
+        yield waypoints[0]
+        for a, b in zip(waypoints, waypoints[1:]):
+            yield from self.refine(a, b)
+
+    def plan(self, start: tuple[int, int], goal: tuple[int, int], stats: dict | None = None) -> list[tuple[int, int]]:
+        """The whole refined path, same format as astar"""
+        waypoints = self.plan_abstract(start, goal, stats)
+        if not waypoints:
+            return []
+
+        path = waypoints[:1]
+        for a, b in zip(waypoints, waypoints[1:]):
+            path.extend(self.refine(a, b))
+        return path
+
+class IncrementalPlanner:
+    """
+    D* Lite: keeps its search (searching from the goal back to the start) between queries, so after
+    a few cells change only the nodes whose distance to the goal actually changed are expanded again,
+    instead of starting from scratch. The start can also move along the path (move_start).
+    """
+    def __init__(self, grid, start: tuple[int, int], goal: tuple[int, int]):
+        self.grid = as_grid(grid)
+        stride = self.grid.stride
+        self.neighbors = [(offset, 1.0 if abs(offset) in (1, stride) else SQRT2) for offset in self.grid.offsets]
+
+        if not self.grid.in_bounds(start) or not self.grid.in_bounds(goal):
+            raise IndexError("start and goal have to be inside the grid")
+
+        self.start = self.grid.index(start)
+        self.goal = self.grid.index(goal)
+        self.g = {}         # missing means inf
+        self.rhs = {self.goal: 0.0}
+        self.open_list = []
+        self.open_keys = {}  # index -> its key in the open list, older heap entries are skipped
+        self.km = 0.0
+        self._push(self.goal)
+
+    def _h(self, a: int, b: int) -> float:
+        stride = self.grid.stride
+        return octile(a % stride - b % stride, a // stride - b // stride)
+
+    def _key(self, index: int) -> tuple[float, float]:
+        best = min(self.g.get(index, float("inf")), self.rhs.get(index, float("inf")))
+        # Rounded so equal costs summed in a different order compare equal.
+        return round(best + self._h(self.start, index) + self.km, 9), round(best, 9)
+
+    def _push(self, index: int):
+        key = self._key(index)
+        self.open_keys[index] = key
+        heappush(self.open_list, (key, index))
+
+    def _top(self):
+        """The smallest valid entry of the open list (or None), stale entries are dropped on the way"""
+        while self.open_list:
+            key, index = self.open_list[0]
+            if self.open_keys.get(index) == key:
+                return key, index
+            heappop(self.open_list)
+        return None
+
+    def _update_vertex(self, index: int):
+        cells = self.grid.cells
+        inf = float("inf")
+
+        if index != self.goal:
+            best = inf
+            if not cells[index]:
+                g = self.g
+                for offset, step in self.neighbors:
+                    neighbor = index + offset
+                    if not cells[neighbor]:
+                        cost = step + g.get(neighbor, inf)
+                        if cost < best:
+                            best = cost
+            self.rhs[index] = best
+
+        self.open_keys.pop(index, None)
+        if self.g.get(index, inf) != self.rhs.get(index, inf):
+            self._push(index)
+
+    def _compute(self) -> int:
+        """Expands nodes until the start is consistent again, returns how many were expanded"""
+        inf = float("inf")
+        g, rhs = self.g, self.rhs
+        cells = self.grid.cells
+        offsets = self.grid.offsets
+        expanded = 0
+
+        while True:
+            top = self._top()
+            start_key = self._key(self.start)
+            if top is None or (top[0] >= start_key and rhs.get(self.start, inf) == g.get(self.start, inf)):
+                return expanded
+
+            old_key, index = top
+            new_key = self._key(index)
+
+            if old_key < new_key:
+                self._push(index)
                 continue
 
-            if grid[neighbor_pos[1]][neighbor_pos[0]] == 1:
+            heappop(self.open_list)
+            del self.open_keys[index]
+            expanded += 1
+
+            if g.get(index, inf) > rhs.get(index, inf):
+                g[index] = rhs[index]
+            else:
+                g[index] = inf
+                self._update_vertex(index)
+
+            for offset in offsets:
+                neighbor = index + offset
+                if not cells[neighbor]:
+                    self._update_vertex(neighbor)
+
+    def path(self) -> list[tuple[int, int]]:
+        """Follows the cheapest neighbors from the start to the goal, [] if the goal can't be reached"""
+        inf = float("inf")
+        g = self.g
+        cells = self.grid.cells
+        current = self.start
+
+        if cells[current] or g.get(current, inf) == inf:
+            return []
+
+        path = [self.grid.pos(current)]
+        while current != self.goal:
+            best, best_cost = -1, inf
+            for offset, step in self.neighbors:
+                neighbor = current + offset
+                if cells[neighbor]:
+                    continue
+                cost = step + g.get(neighbor, inf)
+                if cost < best_cost:
+                    best, best_cost = neighbor, cost
+            if best == -1:
+                return []
+            current = best
+            path.append(self.grid.pos(current))
+
+        return path
+
+    def _finish(self, expanded: int, stats: dict | None, compare: bool) -> list[tuple[int, int]]:
+        path = self.path()
+        if stats is not None:
+            stats["expanded"] = expanded
+            if compare:
+                full = {}
+                astar(self.grid.pos(self.start), self.grid.pos(self.goal), self.grid, stats=full)
+                stats["full_search"] = full["expanded"]
+        return path
+
+    def plan(self, stats: dict | None = None, compare: bool = False) -> list[tuple[int, int]]:
+        """
+        Returns the current path (the first call does the initial search).
+        stats receives the number of expanded nodes, with compare also those of a full A* search.
+        """
+        return self._finish(self._compute(), stats, compare)
+
+    def update(self, changes: list[tuple[tuple[int, int], int]], stats: dict | None = None, compare: bool = False) -> list[tuple[int, int]]:
+        """Applies changed cells ((x, y), value), repairs the search and returns the new path"""
+        cells = self.grid.cells
+        offsets = self.grid.offsets
+
+        for pos, value in changes:
+            if not self.grid.in_bounds(pos):
+                raise IndexError(f"{pos} is outside of the grid")
+            index = self.grid.index(pos)
+            value = 1 if value else 0
+            if cells[index] == value:
                 continue
 
-            tentative_g = current_node["g"] + heuristic(neighbor_pos, goal)
+            cells[index] = value
+            if value:
+                # nothing can stand on an obstacle
+                self.g.pop(index, None)
+            self._update_vertex(index)
+            for offset in offsets:
+                if not cells[index + offset]:
+                    self._update_vertex(index + offset)
+
+        return self._finish(self._compute(), stats, compare)
+
+    def move_start(self, start: tuple[int, int]):
+        """Moves the start (e.g. one step along the path), the search is kept"""
+        if not self.grid.in_bounds(start):
+            raise IndexError(f"{start} is outside of the grid")
+        index = self.grid.index(start)
+        if self.grid.cells[index]:
+            raise ValueError(f"{start} is an obstacle")
+        self.km += self._h(self.start, index)
+        self.start = index
+
+def random_cells(grid: Grid, chance: float, rng: random.Random):
+    """
+    Fills grid with obstacles at the given chance, one random byte per cell compared against a
+    threshold, so chance has a resolution of 1/256. Same seed, same grid, with or without numpy.
+    """
+    threshold = round(min(max(chance, 0), 1) * 256)
+    table = bytes(b < threshold for b in range(256))
+    grid.cells[:] = rng.randbytes(len(grid.cells)).translate(table)
+    grid._fill_border(grid.cells)
+
+def smooth_cells(grid: Grid, steps: int = 4):
+    """
+    Cellular automaton that turns noise into caves: a cell becomes an obstacle when at least 5 cells
+    of its 3x3 block are obstacles, the border counts as obstacle.
+    """
+    cells, s = grid.cells, grid.stride
+    offsets = (0,) + grid.offsets
+
+    for _ in range(steps):
+        if np is not None:
+            a = np.frombuffer(cells, dtype=np.uint8).reshape(grid.height + 2, s)
+            counts = sum(a[1 + dy:grid.height + 1 + dy, 1 + dx:grid.width + 1 + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+            a = a.copy()
+            a[1:-1, 1:-1] = counts >= 5
+            cells[:] = a.tobytes()
+            continue
+
+        # Without numpy: one byte per cell in a big int, the shifted copies add up the 3x3 counts
+        # (at most 9, so nothing carries into the next byte), +3 moves the counts >= 5 onto bit 3
+        n = len(cells)
+        value = int.from_bytes(cells, "little")
+        counts = 0
+        for o in offsets:
+            counts += value >> (8 * o) if o > 0 else value << (-8 * o)
+        counts &= (1 << (8 * n)) - 1
+        ones = int.from_bytes(b"\x01" * n, "little")
+        cells[:] = (((counts + 3 * ones) >> 3) & ones).to_bytes(n, "little")
+        grid._fill_border(cells)
+
+def carve_maze(grid: Grid, rng: random.Random):
+    """
+    Carves a perfect maze (exactly one route between any two rooms) with a randomized depth first search.
+    Rooms are the cells with even x and y, the cells between them are walls or passages.
+    Diagonal moves can't slip through a wall corner in this layout, so the maze stays perfect.
+    """
+    cells = grid.cells
+    cells[:] = b"\x01" * len(cells)
+    rooms_x, rooms_y = (grid.width + 1) // 2, (grid.height + 1) // 2
+    if not rooms_x or not rooms_y:
+        return
+
+    # padded visited lattice of the rooms, so the search doesn't need bounds checks either
+    rs = rooms_x + 2
+    visited = bytearray(b"\x01") * (rs * (rooms_y + 2))
+    for y in range(rooms_y):
+        visited[(y + 1) * rs + 1:(y + 1) * rs + 1 + rooms_x] = bytes(rooms_x)
 
-            if neighbor_pos not in open_dict:
-                neighbor = node(
-                    neighbor_pos,
-                    tentative_g,
-                    heuristic(neighbor_pos, goal),
-                    current_node
-                )
-                heappush(open_list, (neighbor["f"], neighbor_pos))
-                open_dict[neighbor_pos] = neighbor
+    s = grid.stride
+    # every room tries the four directions in a random order, which is the same as picking
+    # one of the unvisited neighbors at random each time the search comes back to it
+    orders = list(permutations(((-1, -1), (1, 1), (-rs, -s), (rs, s))))  # room offset, offset to the wall in between
+    randrange = rng.randrange
 
-            elif tentative_g < open_dict[neighbor_pos]["g"]:
-                neighbor = open_dict[neighbor_pos]
-                neighbor["g"] = tentative_g
-                neighbor["f"] = tentative_g + neighbor["h"]
-                neighbor["parent"] = current_node
+    first = rng.randrange(rooms_x), rng.randrange(rooms_y)
+    room, cell = (first[1] + 1) * rs + first[0] + 1, grid.index((2 * first[0], 2 * first[1]))
+    visited[room] = 1
+    cells[cell] = 0
+    stack = [(room, cell, iter(orders[randrange(24)]))]
 
-    return []
+    while stack:
+        room, cell, moves = stack[-1]
+        for ro, wo in moves:
+            if not visited[room + ro]:
+                visited[room + ro] = 1
+                cells[cell + wo] = 0
+                cells[cell + 2 * wo] = 0
+                stack.append((room + ro, cell + 2 * wo, iter(orders[randrange(24)])))
+                break
+        else:
+            stack.pop()
 
+def carve_corridor(grid: Grid, start: tuple[int, int], goal: tuple[int, int], rng: random.Random):
+    """Clears a random staircase from start to goal, so there always is a path between them"""
+    x, y = start
+    grid[start] = 0
+    while (x, y) != goal:
+        dx = (goal[0] > x) - (goal[0] < x)
+        dy = (goal[1] > y) - (goal[1] < y)
+        if dx and dy:
+            step = rng.randrange(3)
+            dx, dy = (dx, 0) if step == 0 else (0, dy) if step == 1 else (dx, dy)
+        x, y = x + dx, y + dy
+        grid[x, y] = 0
 
-def generate_grid(width=20, height=10, obstacle_chance=0.2, start=None, goal=None):
+def generate_grid(width=20, height=10, obstacle_chance=0.2, start=None, goal=None, flat=False, seed=None, kind="random"):
     """
     Generate a 2D grid map with obstacles.
     
     Parameters:
         width, height: size of the grid
-        obstacle_chance: probability of each cell being an obstacle (0 to 1)
+        obstacle_chance: probability of each cell being an obstacle (0 to 1), for caves the initial fill
         start, goal: optional (x, y) tuples for start and goal positions
+        flat: return a Grid instead of a list of lists
+        seed: makes the map reproducible
+        kind: one of GENERATORS
+            random   independent obstacles
+            maze     perfect maze, obstacle_chance is ignored
+            cave     smoothed noise (works best with obstacle_chance around 0.45)
+            solvable random obstacles with a corridor carved from start to goal
     
     Returns:
-        grid: list of lists containing 0 (free) and 1 (obstacle)
+        grid: list of lists containing 0 (free) and 1 (obstacle), or a Grid if flat is set
         start, goal: tuples with start/goal positions
     """
-    # Initialize empty grid
-    grid = [[0 for y in range(width)] for x in range(height)]
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown kind of grid {kind!r}, expected one of {', '.join(GENERATORS)}")
 
-    # Randomly place obstacles
-    for y in range(height):
-        for x in range(width):
-            if random.random() < obstacle_chance:
-                grid[y][x] = 1  # obstacle
+    rng = random.Random(seed)
+    grid = Grid(width, height)
+
+    if kind == "maze":
+        carve_maze(grid, rng)
+        # start and goal on rooms, so they are always connected
+        def random_pos():
+            return 2 * rng.randrange((width + 1) // 2), 2 * rng.randrange((height + 1) // 2)
+    else:
+        random_cells(grid, obstacle_chance, rng)
+        if kind == "cave":
+            smooth_cells(grid)
+        def random_pos():
+            return rng.randrange(width), rng.randrange(height)
 
     # Choose random start/goal if not provided
     if start is None:
-        start = (random.randint(0, width - 1), random.randint(0, height - 1))
+        start = random_pos()
     if goal is None:
-        goal = (random.randint(0, width - 1), random.randint(0, height - 1))
+        goal = random_pos()
+
+    if kind == "solvable":
+        carve_corridor(grid, start, goal, rng)
 
     # Ensure start and goal are walkable
-    grid[start[1]][start[0]] = 0
-    grid[goal[1]][goal[0]] = 0
+    grid[start] = 0
+    grid[goal] = 0
 
-    return grid, start, goal
+    return (grid if flat else grid.to_rows()), start, goal
 
+GLYPHS = {"free": ". ", "obstacle": "█ ", "path": "P "}
+FREE_COUNTS = bytes([1, 0]) + bytes(254)
+# unscaled rows are rendered from one code byte per cell, bit 0 free, bit 1 path
+CODE_GLYPHS = str.maketrans({"\x00": GLYPHS["obstacle"], "\x01": GLYPHS["free"], "\x02": GLYPHS["path"], "\x03": GLYPHS["path"]})
 
-def print_grid(grid, start, goal, path = None):
+def path_mask(grid: Grid, path) -> bytearray:
+    """Bitmap over the padded cells with a 1 on every cell of path"""
+    mask = bytearray(len(grid.cells))
+    for pos in path or ():
+        mask[grid.index(pos)] = 1
+    return mask
+
+def render_lines(grid, start, goal, path=None, window=None, scale=1) -> list[str]:
     """
-    Nicely print the grid with start and goal markers.
+    Renders the grid as text lines, two characters per cell.
+    
+    window: optional (x, y, width, height) part of the grid to show
+    scale: draws blocks of scale x scale cells as one cell, a block shows the path if any of its cells
+        is on the path, otherwise whatever most of its cells are
     """
-    for y in range(len(grid)):
-        row = ""
-        for x in range(len(grid[0])):
-            if (x, y) == start:
-                row += "S "
-            elif (x, y) == goal:
-                row += "G "
-            elif grid[y][x] == 1:
-                row += "█ "
-            elif path != None and (x, y) in path:
-                row += "P "
+    grid = as_grid(grid)
+    x0, y0, width, height = window or (0, 0, grid.width, grid.height)
+    x0, y0 = max(x0, 0), max(y0, 0)
+    width, height = min(width, grid.width - x0), min(height, grid.height - y0)
+    if width <= 0 or height <= 0:
+        return []
+
+    mask = path_mask(grid, path) if path else None
+    lanes = bytearray(4 * width)
+    lines = []
+
+    if scale == 1:
+        for y in range(y0, y0 + height):
+            first = grid.index((x0, y))
+            codes = grid.cells[first:first + width].translate(FREE_COUNTS)
+            if mask is not None:
+                codes = (int.from_bytes(codes, "little") | int.from_bytes(mask[first:first + width], "little") << 1).to_bytes(width, "little")
+            lines.append(codes.decode("latin-1").translate(CODE_GLYPHS))
+        return _place_markers(lines, start, goal, (x0, y0, width, height), 1)
+
+    for by in range(y0, y0 + height, scale):
+        # Whole rows at once: one 32 bit lane per cell in a big int, adding the rows and the shifted
+        # copies sums the free cells of each block into the lane of its first cell (up to scale * scale,
+        # 16 bit lanes would carry into the next cell from scale 256 on)
+        rows = min(scale, y0 + height - by)
+        free = on_path = 0
+        for y in range(by, by + rows):
+            first = grid.index((x0, y))
+            lanes[::4] = grid.cells[first:first + width].translate(FREE_COUNTS)
+            free += int.from_bytes(lanes, "little")
+            if mask is not None:
+                on_path |= int.from_bytes(mask[first:first + width], "little")
+
+        total, any_path = free, on_path
+        for shift in range(1, scale):
+            total += free >> (32 * shift)
+            any_path |= on_path >> (8 * shift)
+
+        counts = array("I", total.to_bytes(4 * width, "little"))
+        if sys.byteorder == "big":
+            counts.byteswap()
+        paths = any_path.to_bytes(width, "little")
+
+        glyphs = []
+        for x in range(0, width, scale):
+            if paths[x]:
+                glyphs.append(GLYPHS["path"])
             else:
-                row += ". "
-        print(row if row is not None else "")
-    print()
+                size = rows * min(scale, width - x)
+                glyphs.append(GLYPHS["free"] if 2 * counts[x] >= size else GLYPHS["obstacle"])
+
+        lines.append("".join(glyphs))
+
+    return _place_markers(lines, start, goal, (x0, y0, width, height), scale)
+
+def _place_markers(lines, start, goal, window, scale):
+    x0, y0, width, height = window
+    for marker, pos in (("G ", goal), ("S ", start)):
+        if pos is not None and x0 <= pos[0] < x0 + width and y0 <= pos[1] < y0 + height:
+            y, x = (pos[1] - y0) // scale, 2 * ((pos[0] - x0) // scale)
+            lines[y] = lines[y][:x] + marker + lines[y][x + 2:]
+    return lines
+
+def fit_scale(width: int, height: int) -> int:
+    """Smallest scale that fits a width x height grid into the terminal"""
+    columns, rows = shutil.get_terminal_size()
+    columns, rows = max(columns // 2, 1), max(rows - 4, 1)
+    return max(-(-width // columns), -(-height // rows), 1)
+
+def print_grid(grid, start, goal, path = None, window=None, scale=None):
+    """
+    Nicely print the grid with start and goal markers.
+    Grids larger than the terminal are downsampled unless scale is given, see render_lines.
+    """
+    if scale is None:
+        if window:
+            scale = fit_scale(window[2], window[3])
+        else:
+            scale = fit_scale(len(grid[0]) if not isinstance(grid, Grid) else grid.width, len(grid))
+
+    lines = render_lines(grid, start, goal, path, window, scale)
+    if scale > 1:
+        lines.append(f"(1 character is {scale}x{scale} cells)")
+    lines.append("\n")
+    sys.stdout.write("\n".join(lines))
+
+class GridView:
+    """
+    Redraws a grid in place for animations: the first frame clears the terminal,
+    every later frame only rewrites the cells that changed (ANSI cursor moves).
+    """
+    def __init__(self, window=None, scale=1, out=None):
+        self.window = window
+        self.scale = scale
+        self.out = out
+        self.lines = None
+
+    def draw(self, grid, start, goal, path=None, status: str = ""):
+        lines = render_lines(grid, start, goal, path, self.window, self.scale)
+        lines.append(status)
+        out = self.out or sys.stdout
+
+        if self.lines is None or len(lines) != len(self.lines):
+            out.write("\x1b[2J\x1b[H" + "\n".join(lines[:-1]) + "\n" + status + "\x1b[K")
+        else:
+            parts = []
+            for y, (new, old) in enumerate(zip(lines, self.lines)):
+                if new == old:
+                    continue
+                if y == len(lines) - 1:
+                    parts.append(f"\x1b[{y + 1};1H{new}\x1b[K")
+                    continue
+                # rewrite each run of changed cells (2 characters per cell)
+                x = 0
+                while x < len(new):
+                    if new[x:x + 2] == old[x:x + 2]:
+                        x += 2
+                        continue
+                    end = x
+                    while end < len(new) and new[end:end + 2] != old[end:end + 2]:
+                        end += 2
+                    parts.append(f"\x1b[{y + 1};{x + 1}H{new[x:end]}")
+                    x = end
+            out.write("".join(parts))
+
+        out.flush()
+        self.lines = lines
+
+    def close(self):
+        """Moves the cursor below the last frame"""
+        if self.lines is not None:
+            out = self.out or sys.stdout
+            out.write(f"\x1b[{len(self.lines) + 1};1H")
+            out.flush()
 
 def print_path_as_arrows(start, path):
     arrows = {
@@ -154,39 +1695,118 @@ def print_path_as_arrows(start, path):
         (0, -1): "⇧",
         (1, -1): "⇗"
     }
-    path.pop(0)
+    if len(path) < 2:
+        print("(already at the goal)", end="\n\n")
+        return
 
-    path_as_arrows = ""
-    last_pos = path.pop(0)
+    # path starts at start, so the steps are the pairs of consecutive cells
+    path_as_arrows = " ".join(arrows[tuple(map(sub, pos, last_pos))] for last_pos, pos in zip(path, path[1:]))
+    sys.stdout.write(path_as_arrows + " \n\n")
 
-    direction = tuple(map(sub, last_pos, start))
-    path_as_arrows += arrows[direction] + " "
-    
-    for pos in path:
-        direction = tuple(map(sub, pos, last_pos))
-        path_as_arrows += arrows[direction] + " "
-        last_pos = pos
+def grid_size(text: str) -> tuple[int, int]:
+    """Parses WIDTHxHEIGHT"""
+    width, _, height = text.lower().partition("x")
+    width, height = int(width), int(height)
+    if width < 1 or height < 1:
+        raise ValueError(text)
+    return width, height
 
-    print(path_as_arrows, end="\n\n")
+parser = argparse.ArgumentParser(prog="grid", exit_on_error=False, add_help=False)
+parser.add_argument("--algo", choices=ALGORITHMS, default="astar")
+parser.add_argument("--check", type=int, metavar="RUNS", help="Compare jps against plain A* path costs on RUNS random grids")
+parser.add_argument("--replan", type=int, metavar="CELLS", help="Flip CELLS random cells and repair the path with D* Lite")
+parser.add_argument("--kind", choices=GENERATORS, default="random")
+parser.add_argument("--chance", type=float)
+parser.add_argument("--seed", type=int)
+parser.add_argument("--size", type=grid_size, default=(20, 10), metavar="WxH")
+parser.add_argument("--animate", action="store_true")
 
 def do_grid(self, args):
     """
     Generates a maze and solves it (if possible)
 
-    Usage: grid 
+    Usage: grid [--algo astar|jps|hpa] [--kind random|maze|cave|solvable] [--chance P] [--seed N] [--size WxH]
+                [--check RUNS] [--replan CELLS [--animate]]
+        --algo    search algorithm to use (default astar, hpa is hierarchical and near optimal)
+        --kind    kind of map to generate (default random)
+        --chance  obstacle chance (default 0.2, 0.45 for caves)
+        --seed    generate the same map (and changes) again
+        --size    size of the map (default 20x10), maps larger than the terminal are drawn downsampled
+        --check   compare jps path costs with plain A* on RUNS random grids
+        --replan  afterwards flip CELLS random cells and repair the path incrementally (D* Lite)
+        --animate flip the cells one by one and redraw only what changed
     """
-    grid, start, goal = generate_grid(width=20, height=10, obstacle_chance=0.2)
+    try:
+        parsed_args = parser.parse_args(args.split())
+    except (argparse.ArgumentError, SystemExit) as e:
+        print(getattr(e, "message", "Invalid arguments"))
+        return
+
+    if parsed_args.check is not None:
+        failures = check_jps(parsed_args.check)
+        if failures:
+            print(f"{len(failures)} of {parsed_args.check} grids gave a different cost:")
+            for _, start, goal, expected, cost in failures:
+                print(f"  {start} -> {goal}: expected {expected}, jps {cost}")
+        else:
+            print(f"jps matched the A* cost on all {parsed_args.check} grids")
+        return
+
+    chance = parsed_args.chance
+    if chance is None:
+        chance = 0.45 if parsed_args.kind == "cave" else 0.2
+    width, height = parsed_args.size
+    grid, start, goal = generate_grid(width, height, chance, seed=parsed_args.seed, kind=parsed_args.kind, flat=True)
     
     print_grid(grid, start, goal)
     print(f"Start: {start}, Goal: {goal}")
     
-    path = astar(start, goal, grid)
+    components = ComponentIndex(grid)
+    if not components.connected(start, goal):
+        print("No path found (start and goal are in different regions)")
+        return
+
+    stats = {}
+    path = astar(start, goal, grid, parsed_args.algo, stats, components)
+    print(f"Expanded {stats['expanded']} nodes")
     if path != []:
         print_grid(grid, start, goal, path)
         print("Path: ", end="")
         print_path_as_arrows(start, path)
     else:
         print("No path found")
+        return
+
+    if parsed_args.replan:
+        planner = IncrementalPlanner(grid, start, goal)
+        planner.plan()
+
+        rng = random.Random(parsed_args.seed)
+        changes = []
+        while len(changes) < min(parsed_args.replan, width * height - 2):
+            pos = (rng.randrange(width), rng.randrange(height))
+            if pos not in (start, goal):
+                changes.append((pos, rng.random() < 0.5))
+
+        if parsed_args.animate:
+            view = GridView(scale=fit_scale(width, height))
+            view.draw(grid, start, goal, path)
+            for number, change in enumerate(changes, 1):
+                stats = {}
+                path = planner.update([change], stats)
+                view.draw(grid, start, goal, path, f"{number}/{len(changes)}: {change[0]} -> {change[1]:d}, expanded {stats['expanded']} nodes")
+                time.sleep(0.2)
+            view.close()
+            return
+
+        stats = {}
+        path = planner.update(changes, stats, compare=True)
+        print(f"Changed {len(changes)} cells: D* Lite expanded {stats['expanded']} nodes, a full search {stats['full_search']}")
+
+        if path != []:
+            print_grid(planner.grid, start, goal, path)
+        else:
+            print("No path found anymore")
 
 def help_grid(self):
     print(do_grid.__doc__)
\ No newline at end of file
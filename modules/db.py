@@ -1,6 +1,27 @@
 from contextlib import contextmanager
+from itertools import chain, islice
 from pathlib import Path
+from time import perf_counter
+from typing import Iterable, Iterator, Sequence
+import csv
+import json
+import re
 import sqlite3
+import sys
+import threading
+
+# Set on every connection when it's opened
+PRAGMAS = {
+    "journal_mode": "WAL",  # readers and the writer don't block each other
+    "synchronous": "NORMAL",  # safe with WAL, only syncs at checkpoints
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative means KiB, so 64 MiB of page cache
+}
+# Prepared statements sqlite3 keeps per connection, a repeated (parameterized) query isn't parsed again
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 4
+# Rows fetched / inserted per round trip when streaming or bulk loading
+BATCH_SIZE = 1000
 
 def get_db_files() -> list[Path]:
     """Retrieve a list of database file names"""
@@ -8,10 +29,17 @@ def get_db_files() -> list[Path]:
     db_files = [f for f in db_path.glob("*.db")]
     return db_files
 
-def connect_to_db(db_name: str) -> sqlite3.Connection:
+def db_path(db_name: str) -> str | Path:
+    """Path of a database in the project folder (:memory: stays as it is)"""
+    if db_name == ":memory:":
+        return db_name
+    return Path(__file__).parent.parent / db_name
+
+def connect_to_db(db_name: str, pragmas: dict | None = PRAGMAS, check_same_thread: bool = True) -> sqlite3.Connection:
     """Establish a connection to the specified SQLite database"""
-    db_path = Path(__file__).parent.parent / db_name
-    connection = sqlite3.connect(db_path)
+    connection = sqlite3.connect(db_path(db_name), cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=check_same_thread)
+    for name, value in (pragmas or {}).items():
+        connection.execute(f"PRAGMA {name}={value}").fetchall()
     return connection
 
 def close_db_connection(connection: sqlite3.Connection) -> None:
@@ -19,17 +47,372 @@ def close_db_connection(connection: sqlite3.Connection) -> None:
     if connection:
         connection.close()
 
-def execute_query(connection: sqlite3.Connection, query: str) -> list[tuple]:
-    """Execute a SQL query and return the results"""
-    cursor = connection.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    return results
+def execute_query(connection: sqlite3.Connection, query: str, params: tuple | dict = ()) -> list[tuple]:
+    """Execute a SQL query (with ? or :name placeholders filled from params) and return the results"""
+    return connection.execute(query, params).fetchall()
+
+def iter_query(connection: sqlite3.Connection, query: str, params: tuple | dict = (), batch_size: int = BATCH_SIZE) -> Iterator[tuple]:
+    """Like execute_query, but yields the rows batch_size at a time (fetchmany) instead of loading all of them"""
+    cursor = connection.execute(query, params)
+    try:
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+    finally:
+        cursor.close()
+
+def quote_identifier(name: str) -> str:
+    """Table and column names can't be parameters, so they are quoted instead"""
+    return '"' + name.replace('"', '""') + '"'
+
+def bulk_insert(connection: sqlite3.Connection, table: str, rows: Iterable[Sequence], columns: Sequence[str] | None = None,
+                batch_size: int = BATCH_SIZE) -> int:
+    """
+    Inserts rows with executemany in a single transaction (all or nothing), returns the number of rows.
+    rows can be any iterable, it's consumed batch_size rows at a time so a generator keeps memory flat.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    width = len(columns) if columns else len(first)
+    names = f" ({', '.join(map(quote_identifier, columns))})" if columns else ""
+    statement = f"INSERT INTO {quote_identifier(table)}{names} VALUES ({', '.join('?' * width)})"
+
+    count = 0
+    with connection:  # commits at the end, rolls everything back on an error
+        batch = [first, *islice(rows, batch_size - 1)]
+        while batch:
+            connection.executemany(statement, batch)
+            count += len(batch)
+            batch = list(islice(rows, batch_size))
+    return count
+
+def create_table(connection: sqlite3.Connection, table: str, columns: Sequence[str]):
+    """Creates table with untyped columns if it doesn't exist yet"""
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({', '.join(map(quote_identifier, columns))})")
+
+def import_csv(connection: sqlite3.Connection, table: str, path: str | Path, batch_size: int = BATCH_SIZE) -> int:
+    """Loads a CSV file with a header row into table (created from the header if needed), returns the number of rows"""
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        columns = next(reader, None)
+        if not columns:
+            return 0
+        create_table(connection, table, columns)
+        return bulk_insert(connection, table, reader, columns, batch_size)
+
+def import_jsonl(connection: sqlite3.Connection, table: str, path: str | Path, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Loads a JSON lines file (one object per line) into table, returns the number of rows.
+    The columns are the keys of the first object, nested values are stored as JSON text.
+    """
+    with open(path, encoding="utf-8") as file:
+        objects = (json.loads(line) for line in file if line.strip())
+        first = next(objects, None)
+        if first is None:
+            return 0
+        columns = list(first)
+        create_table(connection, table, columns)
+
+        def values(record: dict) -> tuple:
+            return tuple(json.dumps(value) if isinstance(value, (dict, list)) else value
+                         for value in (record.get(column) for column in columns))
+
+        return bulk_insert(connection, table, map(values, chain([first], objects)), columns, batch_size)
+
+class ConnectionPool:
+    """
+    Keeps up to size connections to one database open and hands them out one user at a time.
+    With thread_affinity a thread gets the connection it used last whenever that one is free,
+    so it keeps its warm statement and page cache.
+    """
+
+    def __init__(self, db_name: str, size: int = POOL_SIZE, thread_affinity: bool = True, pragmas: dict | None = PRAGMAS):
+        if size < 1:
+            raise ValueError("A pool needs at least one connection")
+        # every connection to :memory: would be a different database
+        self.size = 1 if db_name == ":memory:" else size
+        self.db_name = db_name
+        self.thread_affinity = thread_affinity
+        self.pragmas = pragmas
+        self.idle: list[sqlite3.Connection] = []
+        self.opened = 0
+        self.closed = False
+        self.available = threading.Condition()
+        self.local = threading.local()
+
+    def acquire(self, timeout: float | None = None) -> sqlite3.Connection:
+        """Takes a connection, waits up to timeout seconds (forever with None) if all of them are in use"""
+        with self.available:
+            if not self.available.wait_for(lambda: self.closed or self.idle or self.opened < self.size, timeout):
+                raise TimeoutError(f"No free connection to {self.db_name} within {timeout}s")
+            if self.closed:
+                raise sqlite3.ProgrammingError(f"The pool of {self.db_name} is closed")
+
+            last = getattr(self.local, "connection", None)
+            if self.thread_affinity and last is not None and last in self.idle:
+                self.idle.remove(last)
+                return last
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                self.opened += 1
+                connection = None
+
+        if connection is None:
+            try:
+                # the pool makes sure only one thread uses a connection at a time
+                connection = connect_to_db(self.db_name, self.pragmas, check_same_thread=False)
+            except Exception:
+                with self.available:
+                    self.opened -= 1
+                    self.available.notify()
+                raise
+        self.local.connection = connection
+        return connection
+
+    def release(self, connection: sqlite3.Connection):
+        """Gives a connection back, a transaction left open is rolled back like closing it would"""
+        if connection.in_transaction:
+            connection.rollback()
+        with self.available:
+            if self.closed:
+                connection.close()
+                self.opened -= 1
+                return
+            self.idle.append(connection)
+            self.available.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Closes the idle connections now and the ones in use when they come back"""
+        with self.available:
+            self.closed = True
+            for connection in self.idle:
+                connection.close()
+            self.opened -= len(self.idle)
+            self.idle.clear()
+            self.available.notify_all()
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_name: str, size: int = POOL_SIZE, thread_affinity: bool = True) -> ConnectionPool:
+    """The shared pool of a database, created on first use (later calls don't change its options)"""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None or pool.closed:
+            pool = _pools[db_name] = ConnectionPool(db_name, size, thread_affinity)
+        return pool
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
 
 @contextmanager
 def get_db_connection(db_name: str):
-    connection = connect_to_db(db_name)
-    try:
+    """Borrows a connection from the database's pool instead of opening a new one"""
+    with get_pool(db_name).connection() as connection:
         yield connection
+
+#region db command
+
+# The database the db command works on, set by db open
+current_db: str | None = None
+PAGE_SIZE = 20
+# The progress handler runs every this many virtual machine steps, which is how the work of a query is counted
+PROGRESS_STEPS = 100
+
+FILTER_PATTERN = re.compile(r"(?:(\w+)\.)?(\w+)\s*(=|==|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)", re.IGNORECASE)
+SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+# words that can follow a table name and are no alias
+KEYWORDS = {"where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group", "order",
+            "limit", "union", "except", "intersect", "window", "having", "indexed", "not", "as"}
+
+def format_rows(columns: list[str], rows: list[tuple]) -> str:
+    """A page of rows as an aligned text table"""
+    cells = [[("NULL" if value is None else str(value)) for value in row] for row in rows]
+    widths = [max([len(column), *(len(row[i]) for row in cells)]) for i, column in enumerate(columns)]
+    lines = [" | ".join(column.ljust(width) for column, width in zip(columns, widths)),
+             "-+-".join("-" * width for width in widths)]
+    lines.extend(" | ".join(value.ljust(width) for value, width in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+def query_plan(connection: sqlite3.Connection, sql: str, params: tuple | dict = ()) -> list[tuple[int, int, str]]:
+    """EXPLAIN QUERY PLAN as (id, parent, detail) rows"""
+    return [(id, parent, detail) for id, parent, _, detail in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def format_plan(plan: list[tuple[int, int, str]]) -> str:
+    depth = {0: -1}
+    lines = []
+    for id, parent, detail in plan:
+        depth[id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[id] + detail)
+    return "\n".join(lines)
+
+def suggest_indexes(connection: sqlite3.Connection, sql: str, plan: list[tuple[int, int, str]]) -> list[str]:
+    """
+    CREATE INDEX suggestions for every table the plan reads with a full SCAN while the query
+    filters on one of its columns (an index can't help a query that reads every row anyway)
+    """
+    # string literals could look like filters
+    code = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    filters = [(qualifier, column.lower()) for qualifier, column, _ in FILTER_PATTERN.findall(code)]
+    # newer sqlite versions name the alias in the plan, not the table
+    aliases = {}
+    for table, alias in TABLE_PATTERN.findall(code):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in KEYWORDS:
+            aliases[alias.lower()] = table
+
+    suggestions = []
+    for _, _, detail in plan:
+        match = SCAN_PATTERN.match(detail)
+        if not match:
+            continue
+        name, alias = match.groups()
+        table = aliases.get(name.lower(), name)
+        names = {name.lower(), table.lower(), (alias or name).lower()}
+        columns = {row[1].lower(): row[1] for row in connection.execute(f"PRAGMA table_info({quote_identifier(table)})")}
+
+        wanted = []
+        for qualifier, column in filters:
+            if column in columns and (not qualifier or qualifier.lower() in names) and columns[column] not in wanted:
+                wanted.append(columns[column])
+        if wanted:
+            suggestions.append(f"CREATE INDEX {quote_identifier('idx_' + table + '_' + '_'.join(wanted))} "
+                               f"ON {quote_identifier(table)} ({', '.join(map(quote_identifier, wanted))})")
+    return suggestions
+
+def run_sql(connection: sqlite3.Connection, sql: str, page_size: int = PAGE_SIZE, paginate: bool = False):
+    """Runs sql and prints the rows a page at a time, then the time it took and how much work it was"""
+    steps = 0
+    def count_steps():
+        nonlocal steps
+        steps += PROGRESS_STEPS
+        return 0
+    connection.set_progress_handler(count_steps, PROGRESS_STEPS)
+
+    rows = 0
+    elapsed = 0.0
+    try:
+        began = perf_counter()
+        cursor = connection.execute(sql)
+        elapsed += perf_counter() - began
+
+        if cursor.description is None:
+            print(f"{cursor.rowcount if cursor.rowcount >= 0 else 0} rows changed")
+        else:
+            columns = [column[0] for column in cursor.description]
+            while True:
+                began = perf_counter()
+                page = cursor.fetchmany(page_size)
+                elapsed += perf_counter() - began  # the time spent waiting for the user doesn't count
+                if not page:
+                    break
+                print(format_rows(columns, page))
+                rows += len(page)
+                if paginate and len(page) == page_size and input("-- more (enter), q to stop -- ").strip().lower() == "q":
+                    break
+            cursor.close()
+            print(f"{rows} rows")
+
+        # writes that return rows (INSERT ... RETURNING) are in a transaction too, the pool would roll it back
+        if connection.in_transaction:
+            connection.commit()
     finally:
-        close_db_connection(connection)
\ No newline at end of file
+        connection.set_progress_handler(None, 0)
+
+    # the handler only runs every PROGRESS_STEPS steps, so small queries never reach it
+    work = f"about {steps}" if steps else f"< {PROGRESS_STEPS}"
+    print(f"{elapsed * 1000:.2f} ms, {work} VM steps")
+    return rows
+
+def do_db(self, args):
+    """
+    Works with the sqlite databases (*.db) in the project folder
+
+    Usage:
+        db                  list the databases
+        db open NAME        use NAME (a file from the list, or :memory:) for the following commands
+        db close            stop using it
+        db tables           list the tables and their row counts
+        db SQL              run SQL, results are shown a page at a time with the elapsed time and the work done
+        db explain SQL      show the query plan and suggest indexes for full table scans
+    """
+    global current_db
+    command, _, rest = args.strip().partition(" ")
+    rest = rest.strip()
+
+    if not command or command == "list":
+        files = get_db_files()
+        if not files:
+            print("No databases found")
+        for file in files:
+            marker = "*" if file.name == current_db else " "
+            print(f"{marker} {file.name} ({file.stat().st_size / 1024:.0f} KiB)")
+        return
+
+    if command == "open":
+        if not rest:
+            print("Usage: db open NAME")
+            return
+        if rest != ":memory:" and not db_path(rest).is_file():
+            print(f"No database called {rest}, see db list")
+            return
+        current_db = rest
+        print(f"Using {rest}")
+        return
+
+    if command == "close":
+        current_db = None
+        return
+
+    if current_db is None:
+        print("No database open, use db open NAME first")
+        return
+
+    try:
+        with get_db_connection(current_db) as connection:
+            if command == "tables":
+                tables = [name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+                for table in tables:
+                    count = connection.execute(f"SELECT count(*) FROM {quote_identifier(table)}").fetchone()[0]
+                    print(f"{table} ({count} rows)")
+                if not tables:
+                    print("No tables")
+                return
+
+            if command == "explain":
+                plan = query_plan(connection, rest)
+                print(format_plan(plan))
+                suggestions = suggest_indexes(connection, rest, plan)
+                for suggestion in suggestions:
+                    print(f"Full table scan, an index could help: {suggestion}")
+                return
+
+            sql = args.strip()
+            run_sql(connection, sql, paginate=sys.stdin.isatty() and sys.stdout.isatty())
+            if sql.split(None, 1)[0].lower() in ("select", "with"):
+                for suggestion in suggest_indexes(connection, sql, query_plan(connection, sql)):
+                    print(f"Full table scan, an index could help: {suggestion}")
+    except sqlite3.Error as e:
+        print(f"SQL error: {e}")
+    except KeyboardInterrupt:
+        print("Stopped")
+
+def help_db(self):
+    print(do_db.__doc__)
+
+#endregion
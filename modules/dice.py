@@ -1,4 +1,256 @@
-from random import randint
+from random import randint, Random
+from functools import lru_cache
+from itertools import accumulate
+from operator import add
+from bisect import bisect_left
+from typing import NamedTuple
+from array import array
+import statistics
+import random
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# An exploding die stops after this many extra rolls, so 1d1! can't loop forever
+EXPLODE_LIMIT = 100
+
+#region Notation compiler
+class DiceTerm(NamedTuple):
+    """One NdS term of a dice expression together with its modifiers"""
+    sign: int
+    count: int
+    sides: int
+    keep: str | None = None    # "h" or "l" to keep the highest / lowest `keep_count` dice
+    keep_count: int = 0
+    explode: bool = False      # roll again and add while a die shows its highest face
+    reroll: int = 0            # reroll (once) dice showing this value or lower
+
+    @property
+    def plain(self) -> bool:
+        return self.keep is None and not self.explode and self.reroll == 0
+
+    @property
+    def kept(self) -> int:
+        return self.count if self.keep is None else self.keep_count
+
+    def roll(self, rng=random) -> int:
+        rolls = [rng.randint(1, self.sides) for _ in range(self.count)]
+
+        if self.reroll:
+            rolls = [rng.randint(1, self.sides) if r <= self.reroll else r for r in rolls]
+
+        if self.explode:
+            for i, r in enumerate(rolls):
+                extra = 0
+                while r == self.sides and extra < EXPLODE_LIMIT:
+                    r = rng.randint(1, self.sides)
+                    rolls[i] += r
+                    extra += 1
+
+        if self.keep is not None:
+            rolls.sort(reverse=self.keep == "h")
+            rolls = rolls[:self.keep_count]
+
+        return self.sign * sum(rolls)
+
+    def roll_many_numpy(self, rng, n_trials: int):
+        if self.plain:
+            # one die at a time keeps the memory at n_trials instead of n_trials * count
+            totals = np.zeros(n_trials, dtype=np.int64)
+            for _ in range(self.count):
+                totals += rng.integers(1, self.sides + 1, size=n_trials, dtype=np.int64)
+            return self.sign * totals
+
+        rolls = rng.integers(1, self.sides + 1, size=(n_trials, self.count), dtype=np.int64)
+
+        if self.reroll:
+            mask = rolls <= self.reroll
+            rolls[mask] = rng.integers(1, self.sides + 1, size=int(mask.sum()), dtype=np.int64)
+
+        if self.explode:
+            rows, cols = np.nonzero(rolls == self.sides)
+            for _ in range(EXPLODE_LIMIT):
+                if len(rows) == 0:
+                    break
+                extra = rng.integers(1, self.sides + 1, size=len(rows), dtype=np.int64)
+                np.add.at(rolls, (rows, cols), extra)
+                again = extra == self.sides
+                rows, cols = rows[again], cols[again]
+
+        if self.keep is not None:
+            rolls.sort(axis=1)
+            rolls = rolls[:, self.count - self.keep_count:] if self.keep == "h" else rolls[:, :self.keep_count]
+
+        return self.sign * rolls.sum(axis=1)
+
+    def __str__(self):
+        text = f"{self.count}d{self.sides}"
+        if self.reroll:
+            text += f"r{self.reroll}"
+        if self.explode:
+            text += "!"
+        if self.keep is not None:
+            text += f"k{self.keep}{self.keep_count}"
+        return text
+
+class Plan(NamedTuple):
+    """A compiled dice expression: the dice terms plus the sum of all constants"""
+    terms: tuple[DiceTerm, ...]
+    constant: int = 0
+
+    @property
+    def simple(self) -> bool:
+        """True for a single plain NdS+M term, the only shape Dice can describe with its fields"""
+        return len(self.terms) == 1 and self.terms[0].plain and self.terms[0].sign == 1
+
+    @property
+    def plain(self) -> bool:
+        return all(term.plain for term in self.terms)
+
+    def roll(self, rng=random) -> int:
+        return sum(term.roll(rng) for term in self.terms) + self.constant
+
+    def roll_many(self, n_trials: int, seed: int | None = None):
+        """
+        Rolls the expression n_trials times in one batch and returns the totals.
+        Returns a numpy array if numpy is installed, otherwise an array.array.
+        The same seed always gives the same totals (for the same backend).
+        """
+        if n_trials < 0:
+            raise ValueError("n_trials can't be negative")
+
+        if np is not None:
+            rng = np.random.default_rng(seed)
+            totals = np.full(n_trials, self.constant, dtype=np.int64)
+            for term in self.terms:
+                totals += term.roll_many_numpy(rng, n_trials)
+            return totals
+
+        rng = Random(seed)
+
+        if not self.plain:
+            return array("q", [self.roll(rng) for _ in range(n_trials)])
+
+        totals = [self.constant] * n_trials
+        for term in self.terms:
+            faces = range(term.sign, term.sign * (term.sides + 1), term.sign)
+            for _ in range(term.count):
+                totals = list(map(add, totals, rng.choices(faces, k=n_trials)))
+        return array("q", totals)
+
+    @property
+    def min_max(self) -> tuple[int, float]:
+        """Lowest and highest possible total (the highest is inf if a die can explode)"""
+        lowest = highest = self.constant
+        for term in self.terms:
+            low = term.kept
+            high = float("inf") if term.explode else term.kept * term.sides
+            if term.sign > 0:
+                lowest, highest = lowest + low, highest + high
+            else:
+                lowest, highest = lowest - high, highest - low
+        return lowest, highest
+
+    @property
+    def mean(self) -> float | None:
+        """Expected total, None if a keep/explode/reroll modifier makes it non trivial"""
+        if not self.plain:
+            return None
+        return sum(term.sign * term.count * (term.sides + 1) / 2 for term in self.terms) + self.constant
+
+    def __str__(self):
+        text = ""
+        for term in self.terms:
+            text += ("-" if term.sign < 0 else "+" if text else "") + str(term)
+        if self.constant or not text:
+            text += f"{self.constant:+d}" if text else str(self.constant)
+        return text
+
+TERM_PATTERN = re.compile(r"([+-]?)([^+-]+)")
+DICE_PATTERN = re.compile(r"(\d*)d(\d+|%)((?:kh|kl|dh|dl|k|d|r|!)\d*)*")
+MODIFIER_PATTERN = re.compile(r"(kh|kl|dh|dl|k|d|r|!)(\d*)")
+
+def parse_dice_term(sign: int, text: str) -> DiceTerm:
+    match = DICE_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Can't parse dice term '{text}'")
+
+    count = int(match.group(1)) if match.group(1) else 1
+    sides = 100 if match.group(2) == "%" else int(match.group(2))
+    if sides < 1:
+        raise ValueError(f"A die needs at least one side: '{text}'")
+
+    modifiers = {}
+    prefix = match.end(2)
+    for op, number in MODIFIER_PATTERN.findall(text[prefix:]):
+        if op in modifiers:
+            raise ValueError(f"Modifier '{op}' used twice in '{text}'")
+        modifiers[op] = int(number) if number else None
+
+    keep, keep_count = None, 0
+    keeps = [op for op in modifiers if op in ("kh", "kl", "dh", "dl", "k", "d")]
+    if len(keeps) > 1:
+        raise ValueError(f"Only one keep/drop modifier per term: '{text}'")
+    if keeps:
+        op = keeps[0]
+        amount = modifiers[op] if modifiers[op] is not None else 1
+        if amount > count:
+            raise ValueError(f"Can't keep or drop {amount} of {count} dice: '{text}'")
+        # dropping the lowest n is keeping the highest count - n and the other way round
+        if op in ("kh", "k"):
+            keep, keep_count = "h", amount
+        elif op == "kl":
+            keep, keep_count = "l", amount
+        elif op in ("dl", "d"):
+            keep, keep_count = "h", count - amount
+        else:
+            keep, keep_count = "l", count - amount
+
+    if "r" in modifiers and modifiers["r"] is None:
+        raise ValueError(f"Reroll needs a value, e.g. r1: '{text}'")
+    reroll = modifiers.get("r") or 0
+    if reroll >= sides:
+        raise ValueError(f"r{reroll} would reroll every face of a d{sides}: '{text}'")
+
+    return DiceTerm(sign, count, sides, keep, keep_count, "!" in modifiers, reroll)
+
+@lru_cache(maxsize=1024)
+def compile_notation(notation: str) -> Plan:
+    """
+    Compiles dice notation into a Plan. Results are cached, so rolling the same expression again skips parsing.
+    Supports sums of terms (2d6+1d4+2), d20, d%, keep/drop (4d6kh3, 4d6dl1, 2d20kl1),
+    exploding dice (3d6!), rerolls (2d6r1: reroll 1s once) and adv / dis (2d20kh1 / 2d20kl1).
+    """
+    text = notation.replace(" ", "").lower()
+    text = text.replace("adv", "2d20kh1").replace("dis", "2d20kl1")
+    if text == "":
+        raise ValueError("Empty dice notation")
+
+    terms = []
+    constant = 0
+    position = 0
+
+    for match in TERM_PATTERN.finditer(text):
+        if match.start() != position or (match.group(1) == "" and position != 0):
+            break
+        position = match.end()
+
+        sign = -1 if match.group(1) == "-" else 1
+        body = match.group(2)
+
+        if body.isdigit():
+            constant += sign * int(body)
+        else:
+            terms.append(parse_dice_term(sign, body))
+
+    if position != len(text):
+        raise ValueError(f"Can't parse dice notation '{notation}'")
+
+    return Plan(tuple(terms), constant)
+#endregion
 
 class Dice:
     total: int = 0
@@ -7,58 +259,226 @@ class Dice:
         self.num_rolls = num_rolls
         self.sides = sides
         self.mod = mod
+        # only set for expressions that don't fit into num_rolls / sides / mod
+        self._plan: Plan | None = None
 
         if die_string is not None and die_string != "":
             self.parse_notation(die_string)
             
     def _roll(self):
+        if self._plan is not None:
+            raise ValueError(f"Single die rolls are only supported for a single NdS+M, not {self._plan}")
         return randint(1, self.sides)
    
     def roll(self):
         """Does not count towards the dice total, but uses the dices settings"""
         return self._roll() + self.mod
 
+    @property
+    def plan(self) -> Plan:
+        """The compiled expression that roll_all and roll_many use"""
+        if self._plan is not None:
+            return self._plan
+        return Plan((DiceTerm(1, self.num_rolls, self.sides),), self.mod)
+
     @property
     def roll_all(self):
         """Rolls all deice and saves in total. Re-rolling will overwrite the total. Same for avg_total"""
-        for _ in range(self.num_rolls):
-            self.total += self._roll()
-        self.total += self.mod
-
+        self.total = self.plan.roll()
         return self.total
 
+    def roll_many(self, n_trials: int, seed: int | None = None):
+        """Rolls all dice n_trials times in one batch and returns the totals (mod included), see Plan.roll_many"""
+        return self.plan.roll_many(n_trials, seed)
+
     def parse_notation(self, notation: str):
         """Parses the DnD string notation for dice rolls into the class parameters"""
-        notation = notation.replace(" ", "")
-        temp = notation.split("d")
-        
-        self.num_rolls = int(temp[0])
+        plan = compile_notation(notation)
 
-        if "+" not in temp[1] and "-" not in temp[1]:
-            self.sides = int(temp[1])
-            return
-        
-        for i, s in enumerate(temp[1]):
-            if not s.isdigit():
-                self.sides = int(temp[1][0:i])
-                self.mod = int(temp[1][i:])
-                break
+        if plan.simple:
+            term = plan.terms[0]
+            self.num_rolls, self.sides, self.mod = term.count, term.sides, plan.constant
+            self._plan = None
+        else:
+            self._plan = plan
     
     @property
     def avg(self):
         """Returns the average total amount for the current dice settings"""
-        sum_sides = sum([x for x in range(1, self.sides + 1)])
-        return (sum_sides / self.sides) * self.num_rolls + self.mod
+        if self._plan is not None:
+            mean = self._plan.mean
+            if mean is None:
+                raise ValueError(f"No closed form average for {self._plan}")
+            return mean
+        return (self.sides + 1) / 2 * self.num_rolls + self.mod
 
     @property
     def min_max(self):
+        if self._plan is not None:
+            return self._plan.min_max
         lowest = self.num_rolls + self.mod
         highest = self.sides * self.num_rolls + self.mod
         return lowest, highest
 
+    @property
+    def distribution(self) -> "Distribution":
+        """Returns the exact probability distribution of the total"""
+        if self._plan is not None:
+            raise ValueError(f"Distributions are only supported for a single NdS+M, not {self._plan}")
+        return Distribution(self.num_rolls, self.sides, self.mod)
+
     def __repr__(self):
+        if self._plan is not None:
+            return f"Dice({self._plan})"
         return f"Dice(Num Rolls: {self.num_rolls}, Sides: {self.sides}, Mod: {self.mod})"
 
+# Above this many dice the distribution is built with numpy's FFT (if installed)
+# instead of the exact integer counts. Both give the same numbers up to float precision.
+FFT_THRESHOLD = 200
+
+def exact_counts(num_rolls: int, sides: int) -> list[int]:
+    """
+    Number of ways to roll each total of NdS (index 0 is the total N).
+    The counts are the coefficients of P = (1 + x + ... + x^(S-1))^N = (1 - x^S)^N / (1 - x)^N, and
+    (1 - x)(1 - x^S) P' = N P (1 - S x^(S-1) + (S-1) x^S) gives each one from three earlier ones,
+    so this is linear in the number of totals instead of convolving N times.
+    """
+    length = num_rolls * (sides - 1) + 1
+    counts = [0] * length
+    counts[0] = 1
+
+    # the counts are symmetric, only the lower half is computed
+    half = length // 2
+    for n in range(half):
+        value = (n + num_rolls) * counts[n]
+        if n >= sides - 1:
+            value += (n - sides + 1 - num_rolls * sides) * counts[n - sides + 1]
+        if n >= sides:
+            value += (num_rolls * (sides - 1) - n + sides) * counts[n - sides]
+        counts[n + 1] = value // (n + 1)  # always exact
+    for n in range(half + 1, length):
+        counts[n] = counts[length - 1 - n]
+
+    return counts
+
+def fft_pmf(num_rolls: int, sides: int) -> list[float]:
+    """Probabilities of each total of NdS, by raising the die polynomial to the Nth power with FFTs"""
+    length = num_rolls * (sides - 1) + 1
+    size = 1 << (length - 1).bit_length()
+    die = np.fft.rfft(np.full(sides, 1 / sides), size)
+    pmf = np.fft.irfft(die ** num_rolls, size)[:length]
+    # rounding noise can dip slightly below zero far out in the tails
+    return np.clip(pmf, 0, None).tolist()
+
+@lru_cache(maxsize=128)
+def dice_tables(num_rolls: int, sides: int) -> tuple[tuple[float, ...], tuple[float, ...], tuple[float, ...]]:
+    """Returns the pmf, cdf and P(total >= t) tables of NdS, cached so repeated queries are lookups"""
+    if num_rolls < 0 or sides < 1:
+        raise ValueError("Need a positive number of sides and no negative amount of dice")
+
+    if np is not None and num_rolls > FFT_THRESHOLD:
+        pmf = fft_pmf(num_rolls, sides)
+        cdf = list(accumulate(pmf))
+        at_least = list(accumulate(reversed(pmf)))[::-1]
+    else:
+        # stay in integers until the very end so nothing is lost to rounding
+        counts = exact_counts(num_rolls, sides)
+        total = sides ** num_rolls
+        pmf = [c / total for c in counts]
+        cdf = [c / total for c in accumulate(counts)]
+        # the distribution is symmetric, P(total >= lowest + i) == P(total <= highest - i)
+        at_least = cdf[::-1]
+
+    return tuple(pmf), tuple(cdf), tuple(at_least)
+
+class Distribution:
+    """The probability distribution of the total of NdS+M"""
+    def __init__(self, num_rolls: int = 1, sides: int = 6, mod: int = 0):
+        self.num_rolls = num_rolls
+        self.sides = sides
+        self.mod = mod
+        self._pmf, self._cdf, self._at_least = dice_tables(num_rolls, sides)
+
+    @property
+    def lowest(self) -> int:
+        return self.num_rolls + self.mod
+
+    @property
+    def highest(self) -> int:
+        return self.num_rolls * self.sides + self.mod
+
+    @property
+    def mean(self) -> float:
+        return (self.sides + 1) / 2 * self.num_rolls + self.mod
+
+    @property
+    def variance(self) -> float:
+        return self.num_rolls * (self.sides ** 2 - 1) / 12
+
+    @property
+    def stdev(self) -> float:
+        return self.variance ** 0.5
+
+    def pmf(self, total: int) -> float:
+        """P(total == t)"""
+        if total < self.lowest or total > self.highest:
+            return 0.0
+        return self._pmf[total - self.lowest]
+
+    def cdf(self, total: int) -> float:
+        """P(total <= t)"""
+        if total < self.lowest:
+            return 0.0
+        if total >= self.highest:
+            return 1.0
+        return self._cdf[total - self.lowest]
+
+    def at_least(self, total: int) -> float:
+        """P(total >= t)"""
+        if total <= self.lowest:
+            return 1.0
+        if total > self.highest:
+            return 0.0
+        return self._at_least[total - self.lowest]
+
+    def percentile(self, p: float) -> int:
+        """Smallest total t with P(total <= t) >= p (p between 0 and 100)"""
+        if not 0 <= p <= 100:
+            raise ValueError("Percentile has to be between 0 and 100")
+        index = bisect_left(self._cdf, p / 100 - 1e-12)
+        return min(index, len(self._cdf) - 1) + self.lowest
+
+    def items(self):
+        """(total, probability) pairs for every possible total"""
+        return zip(range(self.lowest, self.highest + 1), self._pmf)
+
+    def __repr__(self):
+        return f"Distribution(Num Rolls: {self.num_rolls}, Sides: {self.sides}, Mod: {self.mod})"
+
+
+def summarize(totals) -> dict:
+    """Summary statistics for the totals returned by Dice.roll_many"""
+    if len(totals) == 0:
+        raise ValueError("No rolls to summarize")
+
+    if np is not None and isinstance(totals, np.ndarray):
+        return {
+            "rolls": len(totals),
+            "mean": float(totals.mean()),
+            "stdev": float(totals.std()),
+            "min": int(totals.min()),
+            "max": int(totals.max()),
+            "median": float(np.median(totals)),
+        }
+
+    return {
+        "rolls": len(totals),
+        "mean": statistics.fmean(totals),
+        "stdev": statistics.pstdev(totals),
+        "min": min(totals),
+        "max": max(totals),
+        "median": statistics.median(totals),
+    }
 
 def do_dice(self, args):
     """
@@ -66,8 +486,76 @@ def do_dice(self, args):
     Usage: 
         dice [DnD notation]
         dice  (Will default to 1d6 + 0)
+        dice [DnD notation] x<count>  (Rolls count times and prints statistics, e.g. dice 2d6+3 x100000)
+        dice --dist [DnD notation] [>=k]  (Prints the exact distribution, optionally P(total >= k))
+
+    Notation: 2d6+1d4+2, d20, d%, 4d6kh3 / 4d6dl1 (keep highest 3), 2d20kl1 (keep lowest),
+              3d6! (exploding), 2d6r1 (reroll 1s once), adv / dis (2d20 keep highest / lowest)
     """
-    print(Dice(die_string=args).roll_all)
+    notation = []
+    count = None
+    dist = False
+    at_least = None
+
+    for part in args.split():
+        if part == "--dist":
+            dist = True
+        elif part.startswith(">=") and part[2:].lstrip("-").isdigit():
+            at_least = int(part[2:])
+        elif part[0] in "xX" and part[1:].isdigit():
+            count = int(part[1:])
+        else:
+            notation.append(part)
+
+    try:
+        dice = Dice(die_string="".join(notation))
+
+        if dist:
+            print_distribution(dice.distribution, at_least)
+            return
+    except ValueError as e:
+        print(e)
+        return
+
+    if count is None:
+        print(dice.roll_all)
+        return
+
+    if count == 0:
+        print("Nothing to roll")
+        return
+
+    stats = summarize(dice.roll_many(count))
+    lowest, highest = dice.min_max
+    expected = dice.plan.mean
+    print(f"{dice}")
+    print(f"Rolls:  {stats['rolls']}")
+    print(f"Mean:   {stats['mean']:.3f}" + (f" (expected {expected:.3f})" if expected is not None else ""))
+    print(f"Stdev:  {stats['stdev']:.3f}")
+    print(f"Median: {stats['median']}")
+    print(f"Min:    {stats['min']} (possible {lowest})")
+    print(f"Max:    {stats['max']} (possible {highest})")
+
+def print_distribution(dist: Distribution, at_least: int | None = None) -> None:
+    print(dist)
+    print(f"Range:    {dist.lowest} - {dist.highest}")
+    print(f"Mean:     {dist.mean:.3f}")
+    print(f"Variance: {dist.variance:.3f} (stdev {dist.stdev:.3f})")
+    print("Percentiles: " + ", ".join(f"p{p}={dist.percentile(p)}" for p in (5, 25, 50, 75, 95)))
+
+    if at_least is not None:
+        print(f"P(total >= {at_least}) = {dist.at_least(at_least):.6%}")
+        return
+
+    # a row per total is only readable for small ranges
+    if dist.highest - dist.lowest > 60:
+        return
+
+    peak = max(p for _, p in dist.items())
+    print(f"{'Total':>6} {'P(=)':>9} {'P(>=)':>9}")
+    for total, p in dist.items():
+        bar = "█" * round(p / peak * 40)
+        print(f"{total:>6} {p:>9.4%} {dist.at_least(total):>9.4%} {bar}")
 
 def help_dice(self):
     print(do_dice.__doc__)
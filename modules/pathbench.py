@@ -0,0 +1,312 @@
+from pathlib import Path
+from typing import NamedTuple
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from .a_star import ALGORITHMS, GENERATORS, ComponentIndex, Grid, IncrementalPlanner, PathPlanner, generate_grid, path_cost
+
+# Everything a query can be benchmarked with, D* Lite is measured on its initial (full) plan
+VARIANTS = ALGORITHMS + ("dstar",)
+
+# Moving AI maps: these are passable, everything else (@, O, T, W) is an obstacle
+PASSABLE = b".GS"
+
+# Only this many queries run again under tracemalloc, it slows everything down a lot
+MEMORY_QUERIES = 10
+
+
+class Scenario(NamedTuple):
+    start: tuple[int, int]
+    goal: tuple[int, int]
+    optimal: float | None = None  # length given by the .scen file, Moving AI forbids cutting corners, we don't
+
+
+class BenchMap(NamedTuple):
+    name: str
+    grid: Grid
+    scenarios: list[Scenario]
+
+
+#region Moving AI files
+
+def load_map(path: str | Path) -> Grid:
+    """
+    Loads a Moving AI .map file:
+
+        type octile
+        height 4
+        width 5
+        map
+        ..@..
+        ...
+    """
+    with open(path, "rb") as file:
+        header = {}
+        for line in file:
+            line = line.strip()
+            if line == b"map":
+                break
+            key, _, value = line.partition(b" ")
+            header[key.decode()] = value.decode()
+        else:
+            raise ValueError(f"{path}: no map section")
+
+        try:
+            width, height = int(header["width"]), int(header["height"])
+        except (KeyError, ValueError):
+            raise ValueError(f"{path}: missing width or height") from None
+
+        grid = Grid(width, height)
+        table = bytes(0 if b in PASSABLE else 1 for b in range(256))
+        for y in range(height):
+            row = file.readline().rstrip(b"\r\n")
+            if len(row) < width:
+                raise ValueError(f"{path}: row {y} is shorter than the width {width}")
+            first = grid.index((0, y))
+            grid.cells[first:first + width] = row[:width].translate(table)
+
+    return grid
+
+def load_scenarios(path: str | Path) -> dict[str, list[Scenario]]:
+    """
+    Loads a Moving AI .scen file, returns the scenarios grouped by the map they belong to.
+    Each line is: bucket, map, map width, map height, start x, start y, goal x, goal y, optimal length
+    """
+    scenarios = {}
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            fields = line.split("\t") if "\t" in line else line.split()
+            if not fields or fields[0] == "version":
+                continue
+            if len(fields) < 9:
+                raise ValueError(f"{path}:{number}: expected 9 fields, got {len(fields)}")
+
+            _, map_name, _, _, sx, sy, gx, gy, optimal = fields[:9]
+            scenarios.setdefault(map_name, []).append(
+                Scenario((int(sx), int(sy)), (int(gx), int(gy)), float(optimal)))
+
+    return scenarios
+
+def load_benchmark(scen_path: str | Path, limit: int | None = None) -> list[BenchMap]:
+    """Loads a .scen file and the maps it refers to, maps are looked up next to the .scen file"""
+    scen_path = Path(scen_path)
+    maps = []
+    for map_name, scenarios in load_scenarios(scen_path).items():
+        for candidate in (scen_path.parent / map_name, scen_path.parent / Path(map_name).name):
+            if candidate.is_file():
+                break
+        else:
+            raise FileNotFoundError(f"map {map_name} of {scen_path} not found")
+        maps.append(BenchMap(Path(map_name).name, load_map(candidate), scenarios[:limit]))
+    return maps
+
+#endregion
+
+#region Synthetic maps
+
+def random_scenarios(grid: Grid, count: int, rng: random.Random) -> list[Scenario]:
+    """Random start/goal pairs that are connected, so every query has to do real work"""
+    components = ComponentIndex(grid)
+    free = [i for i, cell in enumerate(grid.cells) if not cell]
+    if not free:
+        return []
+
+    scenarios = []
+    for _ in range(count * 20):
+        if len(scenarios) == count:
+            break
+        a, b = rng.choice(free), rng.choice(free)
+        if a != b and components.connected(grid.pos(a), grid.pos(b)):
+            scenarios.append(Scenario(grid.pos(a), grid.pos(b)))
+    return scenarios
+
+def synthetic_maps(sizes: list[int], kinds: list[str], queries: int, seed: int = 0) -> list[BenchMap]:
+    maps = []
+    for size in sizes:
+        for kind in kinds:
+            rng = random.Random(f"{seed}-{kind}-{size}")
+            chance = 0.45 if kind == "cave" else 0.2
+            grid, _, _ = generate_grid(size, size, chance, seed=rng.getrandbits(64), kind=kind, flat=True)
+            maps.append(BenchMap(f"{kind}-{size}", grid, random_scenarios(grid, queries, rng)))
+    return maps
+
+#endregion
+
+#region Running
+
+def make_planner(grid: Grid, variant: str):
+    """Returns plan(start, goal, stats) for a variant, the setup work happens here"""
+    if variant == "dstar":
+        return lambda start, goal, stats: IncrementalPlanner(grid, start, goal).plan(stats)
+    return PathPlanner(grid, variant).plan
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1]
+
+def run_variant(bench: BenchMap, variant: str, reference: list[float | None] | None = None) -> tuple[dict, list[float | None]]:
+    """
+    Runs every scenario of a map with one variant, returns the measurements and the path costs.
+    Costs are compared against reference (the A* costs), to catch variants that stop finding shortest paths.
+    """
+    grid = bench.grid
+    began = time.perf_counter()
+    plan = make_planner(grid, variant)
+    setup = time.perf_counter() - began
+
+    latencies = []
+    costs = []
+    expanded = 0
+    stats = {}
+    for scenario in bench.scenarios:
+        began = time.perf_counter()
+        path = plan(scenario.start, scenario.goal, stats)
+        latencies.append(time.perf_counter() - began)
+        expanded += stats.get("expanded", 0)
+        costs.append(path_cost(path) if path else None)
+
+    # peak memory of the setup and a few queries, in a second pass because tracemalloc is slow
+    tracemalloc.start()
+    try:
+        plan = make_planner(grid, variant)
+        for scenario in bench.scenarios[:MEMORY_QUERIES]:
+            plan(scenario.start, scenario.goal, None)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    latencies.sort()
+    result = {
+        "map": bench.name,
+        "width": grid.width,
+        "height": grid.height,
+        "variant": variant,
+        "queries": len(bench.scenarios),
+        "solved": sum(cost is not None for cost in costs),
+        "setup_ms": setup * 1000,
+        "expanded": expanded,
+        "expanded_mean": expanded / len(bench.scenarios) if bench.scenarios else 0,
+        "paths_per_s": len(latencies) / total if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kib": peak / 1024,
+    }
+    if reference is not None:
+        result["worse_than_astar"] = sum(
+            (cost is None) != (best is None) or (cost is not None and cost > best + 1e-9)
+            for cost, best in zip(costs, reference))
+    return result, costs
+
+def run_benchmark(maps: list[BenchMap], variants=VARIANTS, progress=None) -> dict:
+    """Runs every variant on every map, returns a JSON ready report"""
+    results = []
+    for bench in maps:
+        reference = None
+        for variant in sorted(variants, key=lambda v: v != "astar"):
+            result, costs = run_variant(bench, variant, reference)
+            if variant == "astar":
+                reference = costs
+            results.append(result)
+            if progress:
+                progress(result)
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+
+def format_result(result: dict) -> str:
+    line = (f"{result['map']:<16} {result['variant']:<6} {result['solved']:>5}/{result['queries']:<5} "
+            f"{result['expanded_mean']:>10.0f} {result['paths_per_s']:>9.1f} {result['p50_ms']:>9.3f} "
+            f"{result['p99_ms']:>9.3f} {result['setup_ms']:>9.1f} {result['peak_kib']:>9.0f}")
+    if result.get("worse_than_astar"):
+        line += f"  {result['worse_than_astar']} paths longer than astar"
+    return line
+
+#endregion
+
+def comma_list(text: str) -> list[str]:
+    return [part for part in text.split(",") if part]
+
+def size_list(text: str) -> list[int]:
+    return [int(size) for size in comma_list(text)]
+
+parser = argparse.ArgumentParser(prog="pathbench", exit_on_error=False, add_help=False)
+parser.add_argument("--scen", nargs="+", default=[])
+parser.add_argument("--sizes", type=size_list, default=[64, 128, 256])
+parser.add_argument("--kinds", type=comma_list, default=["random", "maze"])
+parser.add_argument("--variants", type=comma_list, default=list(VARIANTS))
+parser.add_argument("--queries", type=int, default=50)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--json", metavar="FILE")
+
+def do_pathbench(self, args):
+    """
+    Benchmarks the pathfinding algorithms of the grid command
+
+    Usage: pathbench [--scen FILE ...] [--sizes 64,128,256] [--kinds random,maze] [--variants astar,jps,hpa,dstar]
+                     [--queries N] [--seed N] [--json FILE]
+        --scen     Moving AI .scen files to run (the .map files have to be next to them), instead of generated maps
+        --sizes    sizes of the generated square maps
+        --kinds    kinds of generated maps (random, maze, cave, solvable)
+        --variants algorithms to compare (dstar is the initial plan of D* Lite)
+        --queries  start/goal pairs per map (the first N of each map for --scen)
+        --seed     generate other maps
+        --json     also write the report as JSON to FILE (- for stdout only)
+    """
+    try:
+        # parse_known_args, argparse would exit the shell on unknown arguments even with exit_on_error=False
+        parsed_args, extra = parser.parse_known_args(args.split())
+    except argparse.ArgumentError as e:
+        print(e.message)
+        return
+    if extra:
+        print(f"Unknown arguments: {' '.join(extra)}")
+        return
+
+    if any(size < 2 for size in parsed_args.sizes):
+        print("Map sizes have to be at least 2, a map needs room for a start and a goal")
+        return
+    if parsed_args.queries < 1:
+        print("--queries has to be at least 1")
+        return
+
+    unknown = [v for v in parsed_args.variants if v not in VARIANTS] + [k for k in parsed_args.kinds if k not in GENERATORS]
+    if unknown:
+        print(f"Unknown variants or kinds: {', '.join(unknown)}")
+        return
+
+    try:
+        if parsed_args.scen:
+            maps = [bench for path in parsed_args.scen for bench in load_benchmark(path, parsed_args.queries)]
+        else:
+            maps = synthetic_maps(parsed_args.sizes, parsed_args.kinds, parsed_args.queries, parsed_args.seed)
+    except (OSError, ValueError) as e:
+        print(e)
+        return
+
+    quiet = parsed_args.json == "-"
+    if not quiet:
+        print(f"{'map':<16} {'algo':<6} {'solved':>11} {'expanded':>10} {'paths/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'setup ms':>9} {'peak KiB':>9}")
+    report = run_benchmark(maps, parsed_args.variants, None if quiet else lambda result: print(format_result(result), flush=True))
+
+    if parsed_args.json == "-":
+        sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    elif parsed_args.json:
+        with open(parsed_args.json, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved the report to {parsed_args.json}")
+
+def help_pathbench(self):
+    print(do_pathbench.__doc__)